@@ -15,4 +15,6 @@
 
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
-'''
\ No newline at end of file
+'''
+
+from autosym.library import Library, iter_library
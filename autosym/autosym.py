@@ -18,53 +18,215 @@
 
 from __future__ import print_function, absolute_import
 import os
+import sys
 import errno
+import fnmatch
+import time
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from optparse import OptionParser
-from autosym.render import gschem
-from autosym.description import Description, ParsingError
+from autosym import render
+from autosym.description import Description, ParsingError, \
+    LimitExceeded, Limits, read_descriptions, read_dependencies
+from autosym.output import DirectoryWriter, DedupWriter, ArchiveWriter, \
+    CheckWriter
+from autosym.library import Library, make_file_list
+from autosym import lint, pinout
+from autosym.instrument import MetricsCollector
+from autosym.memory import MemoryBudget, parse_size
+from autosym.schedule import CostHistory, makespan
+from autosym.gitdiff import Repository, GitError
 
 
-def generate(f, output_path, options):
-    if not options.quiet:
-        print(f + " >>", end=' ')
-    symd = Description(f)
+def output_name(g, renderer, index, options):
+    """The (folder, filename) of a rendered variant in the output."""
+    subfolder, filename = g.filename(index)
+    if not options.categories:
+        subfolder = None
+    if len(options.renderers) > 1:
+        # one subfolder per output format
+        subfolder = renderer + '/' + subfolder if subfolder else renderer
+    return subfolder, filename
+
+
+def generate(f, writer, options):
+    """Render and write all variants of a description.
+
+    Returns:
+        (`autosym.description.Description`, list): The description and the
+        written paths.
+    """
+    symd = Description(f, limits=options.limits)
     symd.parse()
+    paths = []
     for index, variant in enumerate(symd.variants):
-        g = gschem.Symbol(symd)
-        data = g.generate(index)
-        subfolder, filename = g.filename(index)
-        if subfolder and options.categories:
-            subfolder = output_path+'/'+subfolder+'/'
+        for name in options.renderers:
+            g = render.get_renderer(name)(symd)
+            data = g.generate(index)
+            subfolder, filename = output_name(g, name, index, options)
+            paths.append(writer.write(subfolder, filename, data))
+            data = None
+    return symd, paths
+
+
+def build(file_list, writer, options, library=None, budget=None,
+          history=None):
+    """Generate the symbols of all files.
+
+    Files are processed by `options.jobs` threads in the given order. A
+    description and its rendered symbols are released as soon as the
+    symbols are written.
+
+    Returns:
+        int: Number of files with parsing errors or exceeded limits.
+    """
+    lock = threading.Lock()
+    errors = []
+
+    def process(f):
+        try:
+            start = time.time()
+            symd, paths = generate(f, writer, options)
+            if not options.quiet:
+                with lock:
+                    print(f + " >> " + ' '.join(paths))
+            if history:
+                history.record(f, time.time() - start)
+            if library:
+                with lock:
+                    library.record(f, symd)
+        except ParsingError as e:
+            with lock:
+                print('Parsing error in %s line %d:\n%s' % (
+                    e.file, e.line_nr, e.line), file=sys.stderr)
+                errors.append(f)
+        except LimitExceeded as e:
+            with lock:
+                print('Limit exceeded: %s' % e, file=sys.stderr)
+                errors.append(f)
+
+    def task(f):
+        if budget:
+            with budget.track(f):
+                process(f)
         else:
-            subfolder = output_path+'/'
+            process(f)
 
+    if options.jobs > 1 and len(file_list) > 1:
+        pool = ThreadPool(options.jobs)
         try:
-            os.makedirs(subfolder)
-        except OSError as exc:
-            if exc.errno != errno.EEXIST:
-                raise
-        if not options.quiet:
-            print(subfolder+filename, end=' ')
-        h = open(subfolder+filename, 'w')
-        h.write(data)
-        h.close()
-    if not options.quiet:
-        print()
+            pool.map(task, file_list, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for f in file_list:
+            task(f)
+    return len(errors)
+
 
+def select_files(file_list, path, options):
+    """Filter description files by path, device and category.
+
+    A path filter also selects the files including a matching file. Filters
+    only read the description header of a file.
+    """
+    def match_path(f):
+        rel = os.path.relpath(f, path).replace(os.sep, '/')
+        return any(fnmatch.fnmatchcase(rel, p) for p in options.only_path)
 
-def make_file_list(path):
     ret = []
-    for r, d, f in os.walk(path):
-        for files in f:
-            if files.endswith(".symv"):
-                ret.append(os.path.join(r, files))
-            if files.endswith(".symd"):
-                ret.append(os.path.join(r, files))
+    for f in file_list:
+        if options.only_path and not match_path(f) and \
+                not any(match_path(d) for d in read_dependencies(f)):
+            continue
+        if options.only_device or options.only_category:
+            desc = read_descriptions(f)
+            if options.only_device and not any(
+                    fnmatch.fnmatchcase(desc.get('device', ''), p)
+                    for p in options.only_device):
+                continue
+            if options.only_category and \
+                    desc.get('category', '') not in options.only_category:
+                continue
+        ret.append(f)
     return ret
 
 
+def is_description(path):
+    return path.endswith('.symd') or path.endswith('.symv')
+
+
+def select_changes(repo, file_list, options):
+    """Select the descriptions changed since `options.since`.
+
+    Descriptions including a changed file are selected too.
+
+    Returns:
+        (set, list): Real paths of the changed descriptions and paths of
+                     modified, renamed or deleted descriptions at the
+                     revision.
+    """
+    changed = set()
+    stale = []
+    bases = set()
+    for change in repo.changes(options.since):
+        if change.path:
+            if is_description(change.path):
+                changed.add(os.path.realpath(change.path))
+            else:
+                bases.add(os.path.realpath(change.path))
+        if change.old_path:
+            if is_description(change.old_path):
+                stale.append(change.old_path)
+            else:
+                bases.add(os.path.realpath(change.old_path))
+    if bases:
+        for f in file_list:
+            if any(os.path.realpath(d) in bases
+                   for d in read_dependencies(f)):
+                changed.add(os.path.realpath(f))
+    return changed, stale
+
+
+def remove_stale(repo, stale, writer, options):
+    """Remove outputs of old descriptions that were not rendered again.
+
+    With a `CheckWriter` the outputs are reported as extra instead.
+    """
+    for path in stale:
+        symd = Description(path, limits=options.limits)
+        try:
+            symd.parse(repo.show(options.since, path))
+        except (ParsingError, LimitExceeded, GitError) as e:
+            print('Unable to resolve old outputs of %s: %s' % (path, e),
+                  file=sys.stderr)
+            continue
+        for index in range(len(symd.variants)):
+            for name in options.renderers:
+                g = render.get_renderer(name)(symd)
+                try:
+                    subfolder, filename = output_name(g, name, index,
+                                                      options)
+                except KeyError:
+                    continue
+                if writer.path_of(subfolder, filename) in writer.written:
+                    continue
+                removed = writer.remove(subfolder, filename)
+                if removed and not options.quiet:
+                    print('removed ' + removed)
+
+
 def main():
-    usage = "usage: %prog [options] library-path output-path"
+    if sys.argv[1:2] == ['lint']:
+        return lint.main(sys.argv[2:])
+    if sys.argv[1:2] == ['import-pinout']:
+        return pinout.main(sys.argv[2:])
+
+    usage = "usage: %prog [options] library-path [output-path]\n" \
+            "       %prog lint [options] library-path\n" \
+            "       %prog import-pinout [options] pinout-table [output-path]"
     parser = OptionParser(usage=usage, version="%prog 0.1")
     parser.add_option("-q",
                       default=False, action="store_true", dest="quiet",
@@ -72,34 +234,201 @@ def main():
     parser.add_option("-c",
                       default=False, action="store_true", dest="categories",
                       help="place symbols in category subfolders")
+    parser.add_option("-r", "--renderer", metavar="NAME",
+                      default=[], action="append", dest="renderers",
+                      help="output format, can be repeated to render into "
+                           "one subfolder per format [default: gschem]")
+    parser.add_option("--dedup",
+                      default=False, action="store_true", dest="dedup",
+                      help="hardlink symbols with identical content")
+    parser.add_option("--output-archive", metavar="FILE",
+                      default=None, dest="archive",
+                      help="write symbols into a tar or zip archive instead "
+                           "of a directory, '-' streams a tar to stdout")
+    parser.add_option("--index", metavar="FILE",
+                      default=None, dest="index",
+                      help="update a library index for device lookups")
+    parser.add_option("--only", metavar="GLOB",
+                      default=[], action="append", dest="only_path",
+                      help="only build descriptions whose library relative "
+                           "path matches GLOB")
+    parser.add_option("--only-device", metavar="GLOB",
+                      default=[], action="append", dest="only_device",
+                      help="only build devices matching GLOB")
+    parser.add_option("--only-category", metavar="NAME",
+                      default=[], action="append", dest="only_category",
+                      help="only build devices of category NAME")
+    parser.add_option("--check",
+                      default=False, action="store_true", dest="check",
+                      help="verify that output-path is up to date without "
+                           "writing, exit with 1 on differences")
+    parser.add_option("-j", "--jobs", type="int", metavar="N",
+                      default=1, dest="jobs",
+                      help="number of parallel jobs [default: %default]")
+    parser.add_option("--metrics", metavar="FILE",
+                      default=None, dest="metrics",
+                      help="write build metrics in OpenMetrics format")
+    parser.add_option("--max-memory", metavar="SIZE",
+                      default=None, dest="max_memory",
+                      help="limit the descriptions processed in parallel to "
+                           "stay within SIZE (e.g. 512M) and report the "
+                           "memory usage")
+    parser.add_option("--since", metavar="REV",
+                      default=None, dest="since",
+                      help="only build descriptions changed since the git "
+                           "revision REV and remove outputs of deleted or "
+                           "renamed descriptions")
+    parser.add_option("--history", metavar="FILE",
+                      default=None, dest="history",
+                      help="keep render costs in FILE and start the most "
+                           "expensive descriptions of later builds first, "
+                           "keep it outside the output tree")
+    parser.add_option("--limit", metavar="NAME=VALUE",
+                      default=[], action="append", dest="limits",
+                      help="change a resource limit of a description, one of "
+                           "%s, 0 disables it, can be repeated" % (
+                               ', '.join(Limits.NAMES)))
+    parser.add_option("--no-limits",
+                      default=False, action="store_true", dest="no_limits",
+                      help="don't limit the resources of descriptions")
     (options, args) = parser.parse_args()
 
-    if len(args) < 2:
+    if options.archive:
+        if options.check:
+            parser.error("--check can't be combined with --output-archive")
+        if len(args) != 1:
+            parser.error("incorrect number of arguments")
+    elif len(args) < 2:
         parser.error("incorrect number of arguments")
     symd_path = args[0]
-    output_path = args[1]
+
+    if not options.renderers:
+        options.renderers = ['gschem']
+    options.renderers = sorted(set(options.renderers),
+                               key=options.renderers.index)
+    for name in options.renderers:
+        try:
+            render.get_renderer(name)
+        except KeyError:
+            parser.error("unknown renderer %s, available: %s" % (
+                name, ', '.join(render.available())))
+
+    budget = None
+    if options.max_memory:
+        try:
+            budget = MemoryBudget(parse_size(options.max_memory))
+        except ValueError:
+            parser.error("invalid memory size %s" % options.max_memory)
+
+    limits = None if options.no_limits else Limits.default()
+    for item in options.limits:
+        name, _, value = item.partition('=')
+        if name not in Limits.NAMES:
+            parser.error("unknown limit %s, available: %s" % (
+                name, ', '.join(Limits.NAMES)))
+        try:
+            value = parse_size(value)
+        except ValueError:
+            parser.error("invalid limit %s" % item)
+        if limits is None:
+            limits = Limits()
+        setattr(limits, name, value or None)
+    options.limits = limits
 
     if not os.path.isdir(symd_path):
         parser.error("input path is not a directory")
 
-    try:
-        os.makedirs(output_path)
-    except OSError as exc:
-        if exc.errno != errno.EEXIST:
-            raise
-    if not os.path.isdir(output_path):
-        parser.error("output path is not a directory")
+    if options.archive:
+        if options.archive == '-':
+            # stdout carries the archive
+            options.quiet = True
+        writer = ArchiveWriter(options.archive, options.dedup)
+    elif options.check:
+        output_path = args[1]
+        if not os.path.isdir(output_path):
+            parser.error("output path is not a directory")
+        filtered = options.only_path or options.only_device or \
+            options.only_category or options.since
+        # comparisons hash files and release the interpreter lock
+        writer = CheckWriter(output_path, multiprocessing.cpu_count(),
+                             extra=not filtered)
+    else:
+        output_path = args[1]
+        try:
+            os.makedirs(output_path)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+        if not os.path.isdir(output_path):
+            parser.error("output path is not a directory")
+        if options.dedup:
+            writer = DedupWriter(output_path)
+        else:
+            writer = DirectoryWriter(output_path)
 
     # find all symd files in input directory
     file_list = make_file_list(symd_path)
+    selected = select_files(file_list, symd_path, options)
 
-    # generate symbols for symbol description files
-    for f in file_list:
+    repo = None
+    stale = []
+    if options.since:
         try:
-            generate(f, output_path, options)
-        except ParsingError as e:
-            print('Parsing error in %s line %d:\n%s' % (
-                e.file, e.line_nr, e.line))
+            repo = Repository(symd_path)
+            changed, stale = select_changes(repo, file_list, options)
+        except GitError as e:
+            parser.error(str(e))
+        selected = [f for f in selected if os.path.realpath(f) in changed]
+
+    library = None
+    if options.index and not options.check:
+        library = Library(symd_path, options.index)
+
+    collector = None
+    if options.metrics:
+        collector = MetricsCollector()
+        collector.attach()
+
+    history = CostHistory(options.history, symd_path)
+    selected = history.order(selected)
+    predicted = None
+    if history.known():
+        predicted = makespan([history.estimate(f) for f in selected],
+                             options.jobs)
+
+    # generate symbols for symbol description files
+    if budget:
+        budget.start()
+    start = time.time()
+    errors = build(selected, writer, options, library, budget, history)
+    actual = time.time() - start
+    if stale and not options.archive:
+        remove_stale(repo, stale, writer, options)
+    writer.close()
+    if budget:
+        budget.stop()
+        if not options.quiet:
+            print(budget.report())
+    if collector:
+        collector.detach()
+        collector.dump(options.metrics)
+    if library:
+        library.prune(file_list)
+        library.save()
+    if not options.check:
+        history.prune(file_list)
+        history.save()
+    if predicted is not None and not options.quiet:
+        print('critical path predicted %.2fs, actual %.2fs' % (
+            predicted, actual))
+    summary = writer.summary()
+    if options.check:
+        if not writer.ok or not options.quiet:
+            print(summary)
+        if errors or not writer.ok:
+            return 1
+    elif summary and not options.quiet:
+        print(summary)
     return 0
 
 
@@ -15,8 +15,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import re
+import threading
 
+from autosym import instrument
 
 re_option = re.compile("^\[([A-Za-z ]+)\]?")
 re_config = re.compile("^([\S ]+)=([\S ]+)?")
@@ -37,6 +40,230 @@ class ParsingError(Exception):
         return repr(self.line)
 
 
+class LimitExceeded(Exception):
+    """A description exceeds a resource limit.
+
+    Args:
+        file (`string`): The description file.
+        limit (`string`): Name of the exceeded limit, see `Limits`.
+        maximum (int): The configured limit.
+    """
+
+    def __init__(self, file, limit, maximum):
+        Exception.__init__(self, file, limit, maximum)
+        self.file = file
+        self.limit = limit
+        self.maximum = maximum
+
+    def __str__(self):
+        return '%s exceeds the limit of %d %s' % (
+            self.file, self.maximum, self.limit.replace('_', ' '))
+
+
+class Limits(object):
+    """Resource limits of a description.
+
+    Limits are checked while reading and rendering, a description fails with
+    `LimitExceeded` as soon as it crosses one instead of after the work has
+    been done. A limit of None is not checked.
+
+    Args:
+        input_bytes (int): Size of the description file.
+        lines (int): Lines of the description file.
+        variants (int): Variants of the description.
+        pins (int): Pins of a single variant.
+        total_pins (int): Pins of all variants together, this bounds the
+                          cost of building a description.
+        output_bytes (int): Size of a single rendered symbol.
+    """
+
+    NAMES = ('input_bytes', 'lines', 'variants', 'pins', 'total_pins',
+             'output_bytes')
+
+    def __init__(self, input_bytes=None, lines=None, variants=None, pins=None,
+                 total_pins=None, output_bytes=None):
+        self.input_bytes = input_bytes
+        self.lines = lines
+        self.variants = variants
+        self.pins = pins
+        self.total_pins = total_pins
+        self.output_bytes = output_bytes
+
+    @classmethod
+    def default(cls):
+        """Limits used by the command line and the library API.
+
+        They are far above any real part but bound the time and memory a
+        single description can take.
+        """
+        return cls(input_bytes=4 << 20, lines=100000, variants=256,
+                   pins=16384, total_pins=1 << 17, output_bytes=16 << 20)
+
+    def check(self, path, limit, value):
+        """Raise `LimitExceeded` if `value` is above a limit.
+
+        Args:
+            path (`string`): The description file.
+            limit (`string`): The limit name.
+            value (int): The current amount.
+        """
+        maximum = getattr(self, limit)
+        if maximum is not None and value > maximum:
+            raise LimitExceeded(path, limit, maximum)
+
+
+def _include_path(path, name):
+    return os.path.normpath(os.path.join(os.path.dirname(path), name))
+
+
+def _scan_header(path):
+    descriptions = {}
+    includes = []
+    option = ''
+    sections = set()
+    handler = open(path)
+    try:
+        for line in handler:
+            line = line.strip('\n\r\t ')
+            vtype, value, comment = Description._parse_line(line)
+            if vtype == "OPTION":
+                # the header ends with the first other section after the
+                # description
+                if 'description' in sections and \
+                        value not in ('description', 'include'):
+                    break
+                option = value
+                sections.add(value)
+            if option == 'description' and vtype == "CONFIG":
+                descriptions[value[0]] = value[1]
+            if option == 'include' and vtype == "CONFIG" and \
+                    value[0] == 'file':
+                includes.append(_include_path(path, value[1]))
+    finally:
+        handler.close()
+    return descriptions, includes
+
+
+def read_descriptions(path):
+    """Read the description section of a symbol description file.
+
+    Only the file header is read, scanning stops at the end of the
+    ``[description]`` section. Descriptions of included files are merged.
+    No variants or pins are built.
+
+    Args:
+        path (`string`): The path to the symbol description file.
+
+    Returns:
+        dict: The description key / value pairs.
+    """
+    return _read_descriptions(path, set([os.path.normpath(path)]))
+
+
+def _read_descriptions(path, seen):
+    descriptions, includes = _scan_header(path)
+    ret = {}
+    for base in includes:
+        if base in seen:
+            continue
+        seen.add(base)
+        try:
+            ret.update(_read_descriptions(base, seen))
+        except IOError:
+            # missing includes are reported when parsing
+            pass
+    ret.update(descriptions)
+    return ret
+
+
+def read_dependencies(path):
+    """List the files included by a symbol description file.
+
+    Only the file headers are read.
+
+    Args:
+        path (`string`): The path to the symbol description file.
+
+    Returns:
+        list: Normalized paths of all direct and indirect includes.
+    """
+    ret = []
+    todo = _scan_header(path)[1]
+    while todo:
+        base = todo.pop(0)
+        if base in ret:
+            continue
+        ret.append(base)
+        try:
+            todo.extend(_scan_header(base)[1])
+        except IOError:
+            # missing includes are reported when parsing
+            pass
+    return ret
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+class BaseCache(object):
+    """Cache of resolved include files.
+
+    Included descriptions are read once and shared by all descriptions that
+    include them. An entry is reread when the modification time or size of
+    its file or of any file it includes changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}
+
+    def clear(self):
+        """Drop all cached descriptions."""
+        with self._lock:
+            self._entries = {}
+
+    def resolve(self, path, stack=(), limits=None):
+        """Get a read but not built description of an include file.
+
+        Args:
+            path (`string`): The include file.
+            stack (tuple): The include chain leading to this file.
+            limits (`Limits`): Resource limits to read the file with.
+
+        Raises:
+            IOError: The include file can't be read.
+            ParsingError: The include file is invalid.
+            ValueError: The include chain is circular.
+            LimitExceeded: The include file exceeds the limits.
+        """
+        path = os.path.abspath(path)
+        if path in stack:
+            raise ValueError('circular include of %s' % path)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and all(_stamp(p) == stamp for p, stamp in entry[0]):
+                return entry[1]
+            base = Description(path, cache=self, limits=limits)
+            base._stack = stack + (path,)
+            base._read()
+            stamps = [(path, (st.st_mtime, st.st_size))]
+            stamps.extend((d, _stamp(d)) for d in base._dependencies)
+            self._entries[path] = (stamps, base)
+            return base
+
+
+def _parse_info(result, desc, *args, **kwargs):
+    return {'path': desc._path,
+            'variants': len(desc._variants),
+            'pins': sum(len(v.pins()) for v in desc._variants)}
+
+
 class Pin(object):
     class Direction(object):
         none, left, right, bottom, top = range(5)
@@ -103,6 +330,11 @@ class Variant(object):
         self._footprints = []
         self.footprint = footprint
         self.options = {}
+        # pin indexes, kept up to date by append_pin
+        self._by_direction = {}
+        self._by_number = {}
+        self._by_name = {}
+        self._by_type = {}
 
     def __str__(self):
         return self.description()
@@ -113,6 +345,10 @@ class Variant(object):
         if filter_empty and pin.empty:
             return
         self._pins.append(pin)
+        self._by_direction.setdefault(pin.direction, []).append(pin)
+        self._by_number.setdefault(pin.number, pin)
+        self._by_name.setdefault(pin.name, []).append(pin)
+        self._by_type.setdefault(pin.type, []).append(pin)
 
     def append_footprint(self, fp):
         self._footprints.append(fp)
@@ -138,30 +374,77 @@ class Variant(object):
 
     def pins(self, direction=None):
         if direction:
-            return filter(lambda x: x.direction == direction, self._pins)
+            return self._by_direction.get(direction, [])
 
         return self._pins
 
+    def pin(self, number):
+        """Get a pin by its number.
+
+        Args:
+            number (`string`): The pin number.
+
+        Returns:
+            `Pin`: The first pin with this number or None.
+        """
+        return self._by_number.get(number)
+
+    def pins_named(self, name):
+        """List of pins with the given name."""
+        return self._by_name.get(name, [])
+
+    def pins_of_type(self, io_type):
+        """List of pins with the given io type."""
+        return self._by_type.get(io_type, [])
+
 
 class Description(object):
     """The symbol description parses and holds information for a symbol.
 
     Tis class provides information about the different variants op a symbol.
 
+    A description can include base files in an ``[include]`` section with
+    ``file=path`` lines, paths are relative to the including file. Options
+    and descriptions of the bases are merged, mapping, variant and footprint
+    sections are inherited if the description doesn't define them. Later
+    includes override earlier ones.
+
     Args:
         path (`string`): The path to the symbol description file.
+        cache (`BaseCache`): Cache for included files, defaults to a cache
+                             shared by all descriptions.
+        limits (`Limits`): Resource limits, None for no limits.
     """
 
-    def __init__(self, path):
+    def __init__(self, path, cache=None, limits=None):
         self._m_left = []
         self._m_right = []
         self._variant_lines = []
         self._variants = []
+        self._variants_by_package = {}
+        self._footprints_by_package = {}
         self._descriptions = {}
         self._options = {}
         self._footprints = []
         self._path = path
         self._error = False
+        # source line numbers of the rows of each list section
+        self._line_nrs = {'mapping left': [], 'mapping right': [],
+                          'variants': [], 'footprints': []}
+        self._cache = cache if cache is not None else base_cache
+        self._stack = (os.path.abspath(path),)
+        self._dependencies = []
+        self._limits = limits
+
+    @property
+    def path(self):
+        """The path of the description file."""
+        return self._path
+
+    @property
+    def limits(self):
+        """The `Limits` of the description or None."""
+        return self._limits
 
     @property
     def height(self):
@@ -190,25 +473,152 @@ class Description(object):
 
         m = re_config.match(line)
         if m:
-            return "CONFIG", map(str.strip, m.groups()), comment
+            return "CONFIG", list(map(str.strip, m.groups())), comment
 
-        grp = re.split(":?", line)
+        grp = line.split(":")
         if len(grp) > 1:
-            return "VALUE", map(str.strip, grp), comment
+            return "VALUE", list(map(str.strip, grp)), comment
 
         return "ERROR", 0, comment
 
-    def parse(self):
-        """Parse symbol description."""
+    @instrument.timed('parse', _parse_info)
+    def parse(self, lines=None):
+        """Parse symbol description.
+
+        Args:
+            lines (list): Content of the description, read from the
+                          description path if None.
+
+        Raises:
+            ParsingError: The description is invalid.
+            LimitExceeded: The description exceeds its limits.
+        """
+        self._read(lines)
+        self._build()
+
+    def add_variant(self, package, name):
+        """Add a variant to a description that is built in code.
 
-        handler = open(self._path)
-        data = handler.readlines()
+        Args:
+            package (`string`): The package name, ``-`` for none.
+            name (`string`): The variant name.
+        """
+        self._variant_lines.append([package, name])
+        self._line_nrs['variants'].append(0)
+
+    def add_footprints(self, package, footprints):
+        """Add footprints of a package.
+
+        Args:
+            package (`string`): The package name.
+            footprints (list): The footprint names.
+        """
+        self._footprints.append([package, ', '.join(footprints)])
+        self._line_nrs['footprints'].append(0)
+
+    def add_pin(self, direction, numbers, name, io_type):
+        """Add a mapping row.
+
+        Args:
+            direction (int): `Pin.Direction.left` or `Pin.Direction.right`.
+            numbers (list): The pin number of every variant, ``-`` if the
+                            pin doesn't exist in a variant.
+            name (`string`): The pin name.
+            io_type (`string`): The pin type.
+        """
+        row = [list(numbers), name, io_type]
+        if direction == Pin.Direction.right:
+            self._m_right.append(row)
+            self._line_nrs['mapping right'].append(0)
+        else:
+            self._m_left.append(row)
+            self._line_nrs['mapping left'].append(0)
+
+    def build(self):
+        """Create the variants of a description that is built in code."""
+        self._variants = []
+        self._variants_by_package = {}
+        self._footprints_by_package = {}
+        self._build()
+
+    def dump(self, handler):
+        """Write the description in the symbol description format.
+
+        Args:
+            handler (file): The file to write to.
+
+        Raises:
+            ValueError: A value can't be represented in the format.
+        """
+        def check(value):
+            if '#' in value or '\n' in value:
+                raise ValueError('Value %r can\'t be written.' % value)
+            return value
+
+        def check_row(values):
+            for value in values:
+                if ':' in check(value):
+                    raise ValueError('Value %r can\'t be written.' % value)
+            return ':'.join(values)
+
+        for section, values in (('description', self._descriptions),
+                                ('option', self._options)):
+            if values:
+                handler.write('[%s]\n' % section)
+                for key in sorted(values):
+                    handler.write('%s=%s\n' % (check(key),
+                                               check(values[key])))
+                handler.write('\n')
+        for section, rows in (('variants', self._variant_lines),
+                              ('footprints', self._footprints)):
+            if rows:
+                handler.write('[%s]\n' % section)
+                for row in rows:
+                    handler.write(check_row(row) + '\n')
+                handler.write('\n')
+        for section, rows in (('mapping left', self._m_left),
+                              ('mapping right', self._m_right)):
+            if rows:
+                # empty lines are part of the mapping, no separator
+                handler.write('[%s]\n' % section)
+                for row in rows:
+                    if row:
+                        if any(',' in n for n in row[0]):
+                            raise ValueError('Pin numbers %r can\'t be '
+                                             'written.' % row[0])
+                        handler.write(check_row(
+                            [','.join(row[0])] + list(row[1:])) + '\n')
+                    else:
+                        handler.write('\n')
+
+    def _read(self, data=None):
+        limits = self._limits
+        max_size = max_lines = None
+        if limits is not None:
+            max_lines = limits.lines
+            if data is None:
+                limits.check(self._path, 'input_bytes',
+                             os.path.getsize(self._path))
+            else:
+                max_size = limits.input_bytes
+        if data is None:
+            handler = open(self._path)
+            data = handler.readlines()
+            handler.close()
 
         option = ''
         line_nr = 0
+        size = 0
+        includes = []
 
         for line in data:
             line_nr += 1
+            if max_lines is not None and line_nr > max_lines:
+                limits.check(self._path, 'lines', line_nr)
+            if max_size is not None:
+                size += len(line)
+                if size > max_size:
+                    limits.check(self._path, 'input_bytes', size)
             # remove all line white spaces
             line = line.strip('\n\r\t ')
             # parse line and check if more handling has to be done
@@ -217,6 +627,8 @@ class Description(object):
                 raise ParsingError(self._path, line_nr, line)
             if vtype == "OPTION":
                 option = value
+                if limits is not None:
+                    self._check_size()
             if option == 'mapping left' and vtype == "VALUE":
                 x = list(value)
                 x[0] = x[0].split(',')
@@ -237,16 +649,79 @@ class Description(object):
                 self._descriptions[value[0]] = value[1]
             if option == 'option' and vtype == "CONFIG":
                 self._options[value[0]] = value[1]
-
+            if option == 'include' and vtype == "CONFIG":
+                if value[0] != 'file':
+                    raise ParsingError(self._path, line_nr, line)
+                includes.append((value[1], line_nr, line))
+            if option in self._line_nrs and (
+                    vtype == "VALUE" or
+                    (vtype == "EMPTY" and option.startswith('mapping'))):
+                self._line_nrs[option].append(line_nr)
+
+        if limits is not None:
+            self._check_size()
+        if includes:
+            self._inherit(includes)
+
+    def _inherit(self, includes):
+        bases = []
+        for name, line_nr, line in includes:
+            try:
+                base = self._cache.resolve(_include_path(self._path, name),
+                                           self._stack, self._limits)
+            except (IOError, OSError, ValueError):
+                raise ParsingError(self._path, line_nr, line)
+            bases.append(base)
+
+        descriptions = {}
+        options = {}
+        for base in bases:
+            descriptions.update(base._descriptions)
+            options.update(base._options)
+            for dep in [base._path] + base._dependencies:
+                if dep not in self._dependencies:
+                    self._dependencies.append(dep)
+        descriptions.update(self._descriptions)
+        options.update(self._options)
+        self._descriptions = descriptions
+        self._options = options
+
+        sections = (('_m_left', 'mapping left'), ('_m_right', 'mapping right'),
+                    ('_variant_lines', 'variants'),
+                    ('_footprints', 'footprints'))
+        for attr, section in sections:
+            if getattr(self, attr):
+                continue
+            for base in reversed(bases):
+                rows = getattr(base, attr)
+                if rows:
+                    setattr(self, attr, list(rows))
+                    # inherited rows have no line in this file
+                    self._line_nrs[section] = [0] * len(rows)
+                    break
+
+    def _check_size(self):
+        variants = len(self._variant_lines)
+        pins = len(self._m_left) + len(self._m_right)
+        self._limits.check(self._path, 'variants', variants)
+        self._limits.check(self._path, 'pins', pins)
+        self._limits.check(self._path, 'total_pins', variants * pins)
+
+    def _build(self):
         symbol_type = self._options.get('type', 'box')
+        if self._limits is not None and symbol_type == 'box':
+            self._check_size()
+
+        for fp in self._footprints:
+            if len(fp) == 2:
+                self._footprints_by_package.setdefault(fp[0], []).extend(
+                    map(str.strip, fp[1].split(',')))
 
         if symbol_type == 'box':
             for idx, variant in enumerate(self._variant_lines):
                 v = Variant(variant[0], variant[1])
-                for fp in self._footprints:
-                    if len(fp) == 2 and fp[0] == variant[0]:
-                        for f in map(str.strip, fp[1].split(',')):
-                            v.append_footprint(f)
+                for f in self._footprints_by_package.get(variant[0], ()):
+                    v.append_footprint(f)
                 cnt = 0
                 for pin in self._m_left:
                     v.append_pin(Pin(pin, idx, Pin.Direction.left, cnt))
@@ -261,11 +736,22 @@ class Description(object):
             rows = int(self._options.get('rows', 1))
             lines_start = int(self._options.get('lines_start', 1))
             lines_end = int(self._options.get('lines_end', 10))
+            if self._limits is not None and lines_end >= lines_start:
+                # check before building, the pins grow quadratic with lines
+                per_line = 2 if rows == 2 else 1
+                first = max(lines_start, 1)
+                self._limits.check(self._path, 'variants',
+                                   lines_end - lines_start + 1)
+                self._limits.check(self._path, 'pins', lines_end * per_line)
+                self._limits.check(
+                    self._path, 'total_pins',
+                    per_line * (lines_end * (lines_end + 1) -
+                                (first - 1) * first) // 2)
 
             for idx, lines in enumerate(range(lines_start, lines_end+1)):
                 v = Variant('%dx%d' % (rows, lines), 'Header package')
                 pin_nr = 1
-                for nr in xrange(lines):
+                for nr in range(lines):
                     pin = Pin([str(pin_nr), str(pin_nr), 'pas'],
                               idx, Pin.Direction.left, nr+1)
                     pin_nr += 1
@@ -281,6 +767,29 @@ class Description(object):
 
                 self._variants.append(v)
 
+        for v in self._variants:
+            self._variants_by_package.setdefault(v.package, v)
+
+    def variant(self, package):
+        """Get a variant by its package name.
+
+        Args:
+            package (`string`): The package name.
+
+        Returns:
+            `Variant`: The first variant of the package or None.
+        """
+        return self._variants_by_package.get(package)
+
+    def footprints(self, package):
+        """List of footprints defined for a package."""
+        return self._footprints_by_package.get(package, [])
+
+    @property
+    def dependencies(self):
+        """List of all files included directly or indirectly."""
+        return self._dependencies
+
     @property
     def variants(self):
         """
@@ -310,3 +819,6 @@ class Description(object):
         Options are key / value pairs that define rendering parameters.
         """
         return self._options
+
+
+base_cache = BaseCache()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Library changes since a git revision"""
+
+import os
+import subprocess
+from collections import namedtuple
+
+Change = namedtuple('Change', 'status path old_path')
+Change.__doc__ = """A changed file of the library.
+
+Args:
+    status (`string`): ``A``dded, ``M``odified, ``D``eleted or ``R``enamed.
+    path (`string`): The current path, None if deleted.
+    old_path (`string`): The path at the revision, None if added.
+"""
+
+
+class GitError(Exception):
+    """A git command failed."""
+    pass
+
+
+def _git(cwd, *args):
+    try:
+        return subprocess.check_output(('git',) + args, cwd=cwd,
+                                       stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitError('git is not available: %s' % e)
+    except subprocess.CalledProcessError as e:
+        raise GitError('git %s failed: %s' % (
+            ' '.join(args), e.stderr.decode('utf-8', 'replace').strip()))
+
+
+def _split(output):
+    return [x.decode('utf-8') for x in output.split(b'\0') if x]
+
+
+class Repository(object):
+    """The git repository containing a library.
+
+    Args:
+        path (`string`): A directory inside the work tree.
+    """
+
+    def __init__(self, path):
+        self.top = _git(path, 'rev-parse', '--show-toplevel').decode(
+            'utf-8').strip()
+        self.pathspec = os.path.relpath(os.path.realpath(path),
+                                        os.path.realpath(self.top))
+
+    def _abspath(self, path):
+        return os.path.join(self.top, path)
+
+    def changes(self, rev):
+        """Files of the library changed in the work tree since a revision.
+
+        Untracked files that are not ignored are reported as added.
+
+        Args:
+            rev (`string`): The git revision.
+
+        Returns:
+            list: `Change` tuples with absolute paths.
+        """
+        ret = []
+        fields = _split(_git(self.top, 'diff', '--name-status', '-M', '-z',
+                             rev, '--', self.pathspec))
+        i = 0
+        while i < len(fields):
+            status = fields[i][0]
+            if status in 'RC':
+                old, new = fields[i + 1], fields[i + 2]
+                i += 3
+                if status == 'R':
+                    ret.append(Change('R', self._abspath(new),
+                                      self._abspath(old)))
+                else:
+                    ret.append(Change('A', self._abspath(new), None))
+                continue
+            path = self._abspath(fields[i + 1])
+            i += 2
+            if status == 'A':
+                ret.append(Change('A', path, None))
+            elif status == 'D':
+                ret.append(Change('D', None, path))
+            else:
+                ret.append(Change('M', path, path))
+        for path in _split(_git(self.top, 'ls-files', '-z', '--others',
+                                '--exclude-standard', '--', self.pathspec)):
+            ret.append(Change('A', self._abspath(path), None))
+        return ret
+
+    def show(self, rev, path):
+        """Content of a file at a revision.
+
+        Args:
+            rev (`string`): The git revision.
+            path (`string`): Absolute path of the file in the work tree.
+
+        Returns:
+            list: The lines of the file.
+        """
+        rel = os.path.relpath(path, self.top).replace(os.sep, '/')
+        data = _git(self.top, 'show', '%s:%s' % (rev, rel))
+        return data.decode('utf-8').splitlines(True)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Instrumentation hooks and metrics export.
+
+Callbacks subscribe to events and receive the event name and a dictionary
+with the event data, always including ``duration`` in seconds. Events are
+only timed while a callback is subscribed.
+
+Events:
+    parse: A description was parsed (``path``, ``variants``, ``pins``).
+    generate: A variant was rendered (``device``, ``package``, ``pins``,
+              ``bytes``).
+    write: A symbol was written (``path``, ``bytes``).
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+_hooks = {}
+
+try:
+    _clock = time.perf_counter
+except AttributeError:
+    _clock = time.time
+
+
+def subscribe(event, callback):
+    """Register a callback for an event.
+
+    Args:
+        event (`string`): The event name.
+        callback (callable): Called with ``(event, data)``.
+    """
+    _hooks[event] = _hooks.get(event, ()) + (callback,)
+
+
+def unsubscribe(event, callback):
+    """Remove a registered callback."""
+    callbacks = tuple(c for c in _hooks.get(event, ()) if c != callback)
+    if callbacks:
+        _hooks[event] = callbacks
+    else:
+        _hooks.pop(event, None)
+
+
+def enabled(event):
+    """True if a callback is registered for the event."""
+    return event in _hooks
+
+
+def emit(event, data):
+    """Pass event data to all callbacks of the event."""
+    for callback in _hooks.get(event, ()):
+        callback(event, data)
+
+
+def timed(event, info):
+    """Decorator emitting an event around a function call.
+
+    Args:
+        event (`string`): The event name.
+        info (callable): Called with the result and the arguments of the
+                         function, returns the event data dictionary.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            callbacks = _hooks.get(event)
+            if not callbacks:
+                return func(*args, **kwargs)
+            start = _clock()
+            result = func(*args, **kwargs)
+            duration = _clock() - start
+            data = info(result, *args, **kwargs)
+            data['duration'] = duration
+            for callback in callbacks:
+                callback(event, data)
+            return result
+        return wrapper
+    return decorator
+
+
+class Histogram(object):
+    """Histogram with fixed upper bucket bounds."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsCollector(object):
+    """Collect counters and histograms of autosym events.
+
+    The collected metrics can be exported in the OpenMetrics / Prometheus
+    text format.
+
+    Args:
+        prefix (`string`): Prefix of all metric names.
+    """
+
+    TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0,
+                    5.0)
+    SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+    EVENTS = ('parse', 'generate', 'write')
+
+    def __init__(self, prefix='autosym'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        for event in self.EVENTS:
+            self._histogram('%s_seconds' % event, self.TIME_BUCKETS,
+                            'Duration of %s events.' % event)
+        self._histogram('symbol_bytes', self.SIZE_BUCKETS,
+                        'Size of rendered symbols.')
+        self._counter('descriptions', 'Parsed descriptions.')
+        self._counter('variants', 'Parsed variants.')
+        self._counter('pins', 'Parsed pins of all variants.')
+        self._counter('symbols', 'Rendered symbols.')
+        self._counter('written_bytes', 'Written symbol bytes.')
+
+    def _histogram(self, name, buckets, text):
+        self._histograms[name] = Histogram(buckets)
+        self._help[name] = text
+
+    def _counter(self, name, text):
+        self._counters[name] = 0
+        self._help[name] = text
+
+    def attach(self):
+        """Subscribe to all autosym events."""
+        for event in self.EVENTS:
+            subscribe(event, self)
+
+    def detach(self):
+        """Unsubscribe from all autosym events."""
+        for event in self.EVENTS:
+            unsubscribe(event, self)
+
+    def __call__(self, event, data):
+        with self._lock:
+            self._histograms['%s_seconds' % event].observe(data['duration'])
+            if event == 'parse':
+                self._counters['descriptions'] += 1
+                self._counters['variants'] += data['variants']
+                self._counters['pins'] += data['pins']
+            elif event == 'generate':
+                self._counters['symbols'] += 1
+                self._histograms['symbol_bytes'].observe(data['bytes'])
+            elif event == 'write':
+                self._counters['written_bytes'] += data['bytes']
+
+    def counter(self, name):
+        """Current value of a counter."""
+        return self._counters[name]
+
+    def text(self):
+        """Metrics in the OpenMetrics text format."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                full = '%s_%s' % (self.prefix, name)
+                lines.append('# TYPE %s counter' % full)
+                lines.append('# HELP %s %s' % (full, self._help[name]))
+                lines.append('%s_total %d' % (full, self._counters[name]))
+            for name in sorted(self._histograms):
+                h = self._histograms[name]
+                full = '%s_%s' % (self.prefix, name)
+                lines.append('# TYPE %s histogram' % full)
+                lines.append('# HELP %s %s' % (full, self._help[name]))
+                total = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    total += count
+                    lines.append('%s_bucket{le="%s"} %d' % (
+                        full, repr(float(bound)), total))
+                lines.append('%s_bucket{le="+Inf"} %d' % (full, h.count))
+                lines.append('%s_sum %s' % (full, repr(h.sum)))
+                lines.append('%s_count %d' % (full, h.count))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Write the metrics in the OpenMetrics text format to a file."""
+        h = open(path, 'w')
+        h.write(self.text())
+        h.close()
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Symbol library and library index"""
+
+import os
+import json
+import errno
+
+from autosym.description import Description, Limits, ParsingError, \
+    LimitExceeded
+from autosym import render
+
+INDEX_VERSION = 2
+
+
+def iter_files(path):
+    """Iterate over the symbol description files of a library."""
+    for r, d, f in os.walk(path):
+        for files in f:
+            if files.endswith(".symv"):
+                yield os.path.join(r, files)
+            if files.endswith(".symd"):
+                yield os.path.join(r, files)
+
+
+def make_file_list(path):
+    return list(iter_files(path))
+
+
+def iter_library(path, renderer='gschem', limits=None, on_error=None):
+    """Iterate over the rendered symbols of a library.
+
+    Descriptions are parsed when they are reached and released after their
+    last variant, one symbol is rendered per step. Memory use therefore does
+    not grow with the library size.
+
+    Args:
+        path (`string`): The library directory.
+        renderer (`string`): The renderer name.
+        limits (`autosym.description.Limits`): Resource limits of every
+            description, defaults to `Limits.default()`. Use ``Limits()``
+            for no limits.
+        on_error (callable): Called with the description path and the
+            exception if a description is invalid or exceeds the limits, the
+            remaining variants of it are skipped and iteration continues.
+            The error is raised if None.
+
+    Yields:
+        (string, string, string, string): The description path, the category
+        folder (can be None), the symbol file name and the symbol content.
+
+    Raises:
+        autosym.description.ParsingError: A description is invalid.
+        autosym.description.LimitExceeded: A description exceeds the limits.
+    """
+    if limits is None:
+        limits = Limits.default()
+    symbol = render.get_renderer(renderer)
+    for source in iter_files(path):
+        try:
+            symd = Description(source, limits=limits)
+            symd.parse()
+        except (ParsingError, LimitExceeded) as e:
+            if on_error is None:
+                raise
+            on_error(source, e)
+            continue
+        for index in range(len(symd.variants)):
+            g = symbol(symd)
+            try:
+                data = g.generate(index)
+            except LimitExceeded as e:
+                if on_error is None:
+                    raise
+                on_error(source, e)
+                break
+            folder, filename = g.filename(index)
+            yield source, folder, filename, data
+        # the symbol and its data reference the description too
+        symd = g = data = None
+
+
+class Library(object):
+    """A symbol description library with an index for fast lookups.
+
+    The index maps every device to its description file, category,
+    variants, packages, footprints and output file names. Lookups are
+    answered from the index, descriptions are only parsed when requested.
+
+    Descriptions that fail to parse during `update` are not indexed, the
+    error is kept in `errors` until the file parses or is removed.
+
+    Args:
+        path (`string`): The library directory.
+        index (`string`): The index file, can be None for an in memory index.
+        limits (`autosym.description.Limits`): Resource limits of parsed
+            descriptions, defaults to `Limits.default()`.
+    """
+
+    def __init__(self, path, index=None, limits=None):
+        self.path = path
+        self.index = index
+        self.limits = limits if limits is not None else Limits.default()
+        self._sources = {}
+        self._devices = {}
+        self._parsed = {}
+        # library relative path -> error of the last failed parse
+        self.errors = {}
+        if index:
+            self.load()
+
+    def load(self):
+        """Load the index file, a missing or outdated index is ignored."""
+        try:
+            h = open(self.index)
+        except IOError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+            return
+        try:
+            data = json.load(h)
+        except ValueError:
+            data = {}
+        finally:
+            h.close()
+        if data.get('version') != INDEX_VERSION:
+            return
+        self._sources = data.get('sources', {})
+        self._rebuild_devices()
+
+    def save(self):
+        """Write the index file."""
+        if not self.index:
+            return
+        data = {'version': INDEX_VERSION, 'sources': self._sources}
+        tmp = self.index + '.tmp'
+        h = open(tmp, 'w')
+        json.dump(data, h, indent=1, sort_keys=True)
+        h.close()
+        os.rename(tmp, self.index)
+
+    def _rebuild_devices(self):
+        self._devices = {}
+        for source, entry in self._sources.items():
+            self._devices.setdefault(entry['device'], source)
+
+    def _relpath(self, path):
+        return os.path.relpath(path, self.path).replace(os.sep, '/')
+
+    def _stat(self, path):
+        st = os.stat(path)
+        return st.st_mtime, st.st_size
+
+    def _changed(self, path, entry):
+        if [entry['mtime'], entry['size']] != list(self._stat(path)):
+            return True
+        for dep, stamp in entry.get('depends', {}).items():
+            try:
+                if list(stamp) != list(self._stat(
+                        os.path.join(self.path, dep))):
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def record(self, path, symd):
+        """Add a parsed description to the index.
+
+        Args:
+            path (`string`): The description file.
+            symd (`autosym.description.Description`): The parsed description.
+        """
+        mtime, size = self._stat(path)
+        desc = symd.descriptions
+        g = render.get_renderer('gschem')(symd)
+        variants = []
+        for index, variant in enumerate(symd.variants):
+            try:
+                folder, filename = g.filename(index)
+            except KeyError:
+                folder, filename = None, None
+            variants.append({
+                'name': variant.name,
+                'package': variant.package,
+                'footprints': list(variant.footprints),
+                'folder': folder,
+                'filename': filename,
+            })
+        source = self._relpath(path)
+        old = self._sources.get(source)
+        if old and self._devices.get(old['device']) == source:
+            del self._devices[old['device']]
+        self._sources[source] = {
+            'mtime': mtime,
+            'size': size,
+            'device': desc.get('device', ''),
+            'category': desc.get('category', ''),
+            'variants': variants,
+            'depends': dict((self._relpath(d), self._stat(d))
+                            for d in symd.dependencies),
+        }
+        self._devices.setdefault(desc.get('device', ''), source)
+        self._parsed.pop(source, None)
+
+    def update(self, file_list=None):
+        """Bring the index up to date with the library.
+
+        Only descriptions that changed since they were indexed are parsed,
+        entries of removed files are dropped. A description that can't be
+        parsed is recorded in `errors` and its old entry is dropped, the
+        other files are still updated.
+
+        Args:
+            file_list (list): The description files, defaults to all files
+                              of the library.
+
+        Returns:
+            int: Number of parsed descriptions.
+        """
+        if file_list is None:
+            file_list = make_file_list(self.path)
+        parsed = 0
+        for path in file_list:
+            source = self._relpath(path)
+            entry = self._sources.get(source)
+            if entry and not self._changed(path, entry):
+                continue
+            symd = Description(path, limits=self.limits)
+            try:
+                symd.parse()
+            except (ParsingError, LimitExceeded) as e:
+                self.errors[source] = e
+                self._drop(source)
+                continue
+            self.record(path, symd)
+            self.errors.pop(source, None)
+            parsed += 1
+        self.prune(file_list)
+        return parsed
+
+    def prune(self, file_list):
+        """Drop index entries of files not in `file_list`.
+
+        Args:
+            file_list (list): The existing description files.
+        """
+        sources = set(self._relpath(path) for path in file_list)
+        for source in list(self._sources):
+            if source not in sources:
+                del self._sources[source]
+                self._parsed.pop(source, None)
+        for source in list(self.errors):
+            if source not in sources:
+                del self.errors[source]
+        self._rebuild_devices()
+
+    def _drop(self, source):
+        entry = self._sources.pop(source, None)
+        self._parsed.pop(source, None)
+        if entry and self._devices.get(entry['device']) == source:
+            self._rebuild_devices()
+
+    @property
+    def devices(self):
+        """Sorted list of all indexed device names."""
+        return sorted(self._devices)
+
+    def find(self, device):
+        """Look up a device in the index.
+
+        Args:
+            device (`string`): The device name.
+
+        Returns:
+            dict: The index entry including the key ``source`` or None.
+        """
+        source = self._devices.get(device)
+        if source is None:
+            return None
+        entry = dict(self._sources[source])
+        entry['source'] = source
+        return entry
+
+    def category(self, category):
+        """Sorted list of all devices in a category."""
+        return sorted(e['device'] for e in self._sources.values()
+                      if e['category'] == category)
+
+    def dependents(self, path):
+        """Sorted list of indexed descriptions that include a file.
+
+        Args:
+            path (`string`): The included file.
+
+        Returns:
+            list: Library relative paths of the dependent descriptions.
+        """
+        base = self._relpath(path)
+        return sorted(source for source, entry in self._sources.items()
+                      if base in entry.get('depends', ()))
+
+    def description(self, device):
+        """Parsed description of a device.
+
+        The description file is parsed on first access only.
+
+        Args:
+            device (`string`): The device name.
+
+        Returns:
+            `autosym.description.Description`: The description or None.
+        """
+        source = self._devices.get(device)
+        if source is None:
+            return None
+        symd = self._parsed.get(source)
+        if symd is None:
+            symd = Description(os.path.join(self.path, source),
+                               limits=self.limits)
+            symd.parse()
+            self._parsed[source] = symd
+        return symd
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Library linter for symbol description files"""
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import json
+import multiprocessing
+from collections import namedtuple
+from optparse import OptionParser
+
+from autosym.description import Description, ParsingError
+from autosym.library import make_file_list
+
+ERROR = 'error'
+WARNING = 'warning'
+
+Diagnostic = namedtuple('Diagnostic', 'path line level code message')
+
+
+def _check_mapping(symd, side, variant_count, diagnostics):
+    rows = symd._m_left if side == 'left' else symd._m_right
+    line_nrs = symd._line_nrs['mapping ' + side]
+    # per variant: pin number -> first line
+    numbers = [{} for _ in range(variant_count)]
+    # pin name -> (io type, first line)
+    names = {}
+    for row, line_nr in zip(rows, line_nrs):
+        if not row:
+            continue
+        if len(row) != 3:
+            diagnostics.append(Diagnostic(
+                symd._path, line_nr, WARNING, 'malformed-pin',
+                'pin row has %d fields instead of 3, it is ignored' %
+                len(row)))
+            continue
+        if len(row[0]) < variant_count:
+            diagnostics.append(Diagnostic(
+                symd._path, line_nr, ERROR, 'short-mapping',
+                '%d pin numbers for %d variants' % (
+                    len(row[0]), variant_count)))
+        for idx, number in enumerate(row[0][:variant_count]):
+            if number == '-':
+                continue
+            first = numbers[idx].get(number)
+            if first is None:
+                numbers[idx][number] = line_nr
+            else:
+                diagnostics.append(Diagnostic(
+                    symd._path, line_nr, ERROR, 'duplicate-number',
+                    'pin number %s of variant %s already used in line %d' %
+                    (number, symd._variant_lines[idx][0], first)))
+        name, io_type = row[1], row[2]
+        first = names.get(name)
+        if first is None:
+            names[name] = (io_type, line_nr)
+        elif first[0] != io_type:
+            diagnostics.append(Diagnostic(
+                symd._path, line_nr, WARNING, 'conflicting-type',
+                'pin %s is %s here and %s in line %d' % (
+                    name, io_type, first[0], first[1])))
+    return numbers
+
+
+def lint_file(path):
+    """Check a single symbol description file.
+
+    Args:
+        path (`string`): The path to the symbol description file.
+
+    Returns:
+        list: List of `Diagnostic` tuples.
+    """
+    diagnostics = []
+    symd = Description(path)
+    try:
+        symd._read()
+    except ParsingError as e:
+        return [Diagnostic(e.file, e.line_nr, ERROR, 'parse-error',
+                           'unable to parse %r' % e.line)]
+
+    if not symd.descriptions.get('device'):
+        diagnostics.append(Diagnostic(path, 0, ERROR, 'missing-device',
+                                      'device name is not defined'))
+
+    if symd.options.get('type', 'box') != 'box':
+        return diagnostics
+
+    packages = set()
+    for variant, line_nr in zip(symd._variant_lines,
+                                symd._line_nrs['variants']):
+        if len(variant) != 2:
+            diagnostics.append(Diagnostic(
+                path, line_nr, ERROR, 'malformed-variant',
+                'variant needs a package and a name'))
+            return diagnostics
+        if variant[0] in packages:
+            diagnostics.append(Diagnostic(
+                path, line_nr, WARNING, 'duplicate-package',
+                'package %s is defined twice' % variant[0]))
+        packages.add(variant[0])
+
+    for fp, line_nr in zip(symd._footprints, symd._line_nrs['footprints']):
+        if len(fp) != 2:
+            diagnostics.append(Diagnostic(
+                path, line_nr, WARNING, 'malformed-footprint',
+                'footprint row needs a package and footprints'))
+        elif fp[0] not in packages:
+            diagnostics.append(Diagnostic(
+                path, line_nr, ERROR, 'unknown-package',
+                'footprint for undefined package %s' % fp[0]))
+
+    count = len(symd._variant_lines)
+    left = _check_mapping(symd, 'left', count, diagnostics)
+    right = _check_mapping(symd, 'right', count, diagnostics)
+    for idx in range(count):
+        for number in left[idx]:
+            if number in right[idx]:
+                diagnostics.append(Diagnostic(
+                    path, right[idx][number], ERROR, 'duplicate-number',
+                    'pin number %s of variant %s already used in line %d' %
+                    (number, symd._variant_lines[idx][0],
+                     left[idx][number])))
+    diagnostics.sort(key=lambda d: d.line)
+    return diagnostics
+
+
+def lint_library(file_list, jobs=1):
+    """Check symbol description files in parallel.
+
+    Args:
+        file_list (list): The description files.
+        jobs (int): Number of worker processes.
+
+    Returns:
+        iterator: Diagnostics of all files, in file order.
+    """
+    if jobs > 1 and len(file_list) > 1:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            for diagnostics in pool.imap(lint_file, file_list, 16):
+                for d in diagnostics:
+                    yield d
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for f in file_list:
+            for d in lint_file(f):
+                yield d
+
+
+def main(argv=None):
+    usage = "usage: %prog lint [options] library-path"
+    parser = OptionParser(usage=usage, prog="autosym")
+    parser.add_option("-j", "--jobs", type="int", metavar="N",
+                      default=multiprocessing.cpu_count(), dest="jobs",
+                      help="number of parallel jobs [default: %default]")
+    parser.add_option("--format", type="choice", choices=["text", "json"],
+                      default="text", dest="format",
+                      help="diagnostic format, text or json (one object "
+                           "per line) [default: %default]")
+    parser.add_option("-W", "--warnings-as-errors",
+                      default=False, action="store_true", dest="strict",
+                      help="exit with 1 on warnings too")
+    (options, args) = parser.parse_args(argv)
+
+    if len(args) != 1:
+        parser.error("incorrect number of arguments")
+    if not os.path.isdir(args[0]):
+        parser.error("input path is not a directory")
+
+    failed = False
+    for d in lint_library(sorted(make_file_list(args[0])), options.jobs):
+        if d.level == ERROR or options.strict:
+            failed = True
+        if options.format == 'json':
+            print(json.dumps(d._asdict(), sort_keys=True))
+        else:
+            print('%s:%d: %s %s: %s' % d)
+    sys.stdout.flush()
+    return 1 if failed else 0
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Memory budget for library builds"""
+
+import os
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+re_size = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)i?[bB]?\s*$")
+
+_UNITS = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30}
+
+
+def parse_size(text):
+    """Convert a size like ``512M`` or ``2G`` into bytes.
+
+    Raises:
+        ValueError: The size can't be parsed.
+    """
+    m = re_size.match(text)
+    if not m:
+        raise ValueError('invalid size %r' % text)
+    return int(float(m.group(1)) * _UNITS[m.group(2).lower()])
+
+
+def _mib(value):
+    return value / float(1 << 20)
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, None if unknown."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.uname()[0] == 'Darwin':
+        return rss
+    return rss * 1024
+
+
+class MemoryBudget(object):
+    """Limit the number of descriptions processed at the same time.
+
+    Allocations are traced with tracemalloc. A description is only admitted
+    while the traced memory plus its expected usage stays below the limit,
+    or when nothing else is in flight. The usage of a description is the
+    peak of the traced memory while it is processed, above the memory traced
+    when it started. The expected usage is estimated from the file size and
+    the largest usage per file byte seen so far. With several descriptions
+    in flight the usage recorded per description is an approximation,
+    allocations are traced for the whole process.
+
+    Args:
+        limit (int): The memory budget in bytes.
+        top (int): Number of descriptions listed in the report.
+    """
+
+    def __init__(self, limit, top=5):
+        self.limit = limit
+        self.top = top
+        self.usage = {}
+        self.peak = 0
+        self._ratio = 64.0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def start(self):
+        """Start tracing allocations."""
+        tracemalloc.start()
+
+    def stop(self):
+        """Stop tracing allocations."""
+        self._update_peak()
+        tracemalloc.stop()
+
+    def _update_peak(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        self.peak = max(self.peak, peak)
+        return peak
+
+    def _reset_peak(self):
+        # the peak is reset per description, keep the overall peak first
+        self._update_peak()
+        reset = getattr(tracemalloc, 'reset_peak', None)
+        if reset is not None:
+            reset()
+
+    @contextmanager
+    def track(self, path):
+        """Context to process a description within the budget.
+
+        Blocks until the description fits into the budget and records the
+        peak memory allocated while the context runs.
+
+        Args:
+            path (`string`): The description file.
+        """
+        try:
+            expected = os.path.getsize(path) * self._ratio
+        except OSError:
+            expected = 0
+        with self._cond:
+            while self._in_flight and \
+                    tracemalloc.get_traced_memory()[0] + expected > \
+                    self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+            self._reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+            with self._cond:
+                used = max(self._update_peak() - start, 0)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+        with self._cond:
+            self.usage[path] = used
+            if expected:
+                self._ratio = max(self._ratio,
+                                  used * self._ratio / float(expected))
+
+    def report(self):
+        """Peak memory and the top allocating descriptions."""
+        lines = ['peak traced memory %.1f MiB of %.1f MiB budget' % (
+            _mib(self.peak), _mib(self.limit))]
+        rss = peak_rss()
+        if rss is not None:
+            lines.append('peak RSS %.1f MiB' % _mib(rss))
+        ranking = sorted(self.usage.items(), key=lambda x: -x[1])
+        for path, used in ranking[:self.top]:
+            lines.append('  %10.1f KiB %s' % (used / 1024.0, path))
+        return '\n'.join(lines)
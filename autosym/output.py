@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Output writers for rendered symbols."""
+
+import io
+import os
+import sys
+import time
+import errno
+import hashlib
+import tarfile
+import threading
+import zipfile
+from multiprocessing.pool import ThreadPool
+
+from autosym import instrument
+
+
+def _write_info(path, writer, folder, filename, data):
+    return {'path': path, 'bytes': len(_encode(data))}
+
+
+def _encode(data):
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return data
+
+
+class DirectoryWriter(object):
+    """Write rendered symbols into a directory tree.
+
+    Args:
+        path (`string`): The output directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.written = set()
+        self._folders = set()
+
+    def _folder(self, folder):
+        if folder:
+            path = os.path.join(self.path, folder)
+        else:
+            path = self.path
+        if path not in self._folders:
+            try:
+                os.makedirs(path)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+            self._folders.add(path)
+        return path
+
+    @staticmethod
+    def _unlink(path):
+        # Existing files may be hardlinked to other symbols, never write
+        # through them.
+        try:
+            os.unlink(path)
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+
+    def _write_file(self, path, data):
+        self._unlink(path)
+        h = open(path, 'wb')
+        h.write(data)
+        h.close()
+
+    @instrument.timed('write', _write_info)
+    def write(self, folder, filename, data):
+        """Write a symbol.
+
+        Args:
+            folder (`string`): The category folder, can be None.
+            filename (`string`): The symbol file name.
+            data (`string`): The symbol content.
+
+        Returns:
+            string: The path of the written symbol.
+        """
+        path = os.path.join(self._folder(folder), filename)
+        self._write_file(path, _encode(data))
+        self.written.add(path)
+        return path
+
+    def path_of(self, folder, filename):
+        """Path of a symbol in the output directory."""
+        if folder:
+            return os.path.join(self.path, folder, filename)
+        return os.path.join(self.path, filename)
+
+    def remove(self, folder, filename):
+        """Remove a symbol.
+
+        Returns:
+            string: The path of the removed symbol or None if it didn't
+                    exist.
+        """
+        path = self.path_of(folder, filename)
+        if not os.path.exists(path):
+            return None
+        self._unlink(path)
+        return path
+
+    def close(self):
+        """Finish writing."""
+        pass
+
+    def summary(self):
+        """Short status report of the writer, can be None."""
+        return None
+
+
+class DedupWriter(DirectoryWriter):
+    """Directory writer that stores identical symbols only once.
+
+    Every symbol body is hashed, symbols identical to an already written one
+    are hardlinked to it. If the file system does not support hardlinks, a
+    regular copy is written.
+
+    Args:
+        path (`string`): The output directory.
+    """
+
+    def __init__(self, path):
+        super(DedupWriter, self).__init__(path)
+        self._lock = threading.Lock()
+        # digest -> first path with that content, path -> digest
+        self._store = {}
+        self._digests = {}
+        self.saved_bytes = 0
+        self.saved_inodes = 0
+
+    @instrument.timed('write', _write_info)
+    def write(self, folder, filename, data):
+        path = os.path.join(self._folder(folder), filename)
+        data = _encode(data)
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            self.written.add(path)
+            return self._write_dedup(path, data, digest)
+
+    def _write_dedup(self, path, data, digest):
+        old = self._digests.get(path)
+        if old is not None and old != digest and self._store.get(old) == path:
+            # the path no longer holds the old content
+            del self._store[old]
+        self._digests[path] = digest
+        source = self._store.get(digest)
+        if source is None:
+            self._write_file(path, data)
+            self._store[digest] = path
+            return path
+        if source == path:
+            return path
+
+        self._unlink(path)
+        try:
+            os.link(source, path)
+        except OSError:
+            self._write_file(path, data)
+        else:
+            self.saved_bytes += len(data)
+            self.saved_inodes += 1
+        return path
+
+    def summary(self):
+        return "deduplicated symbols saved %d inodes and %d bytes" % (
+            self.saved_inodes, self.saved_bytes)
+
+
+class ArchiveWriter(object):
+    """Stream rendered symbols into a tar or zip archive.
+
+    The archive type is selected by the file name: ``.zip`` creates a zip
+    archive, ``.tar.gz``/``.tgz`` and ``.tar.bz2`` compressed tar archives and
+    everything else a plain tar archive. The path ``-`` streams a tar archive
+    to stdout.
+
+    Args:
+        path (`string`): The archive path or ``-`` for stdout.
+        dedup (`bool`): Store identical tar members as hardlinks.
+    """
+
+    def __init__(self, path, dedup=False):
+        self.path = path
+        self._dedup = dedup
+        self._store = {}
+        self._lock = threading.Lock()
+        self._mtime = time.time()
+        self._zip = None
+        self._tar = None
+        if path == '-':
+            stream = getattr(sys.stdout, 'buffer', sys.stdout)
+            self._tar = tarfile.open(fileobj=stream, mode='w|')
+        elif path.endswith('.zip'):
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        elif path.endswith('.tar.gz') or path.endswith('.tgz'):
+            self._tar = tarfile.open(path, 'w:gz')
+        elif path.endswith('.tar.bz2'):
+            self._tar = tarfile.open(path, 'w:bz2')
+        else:
+            self._tar = tarfile.open(path, 'w')
+
+    @instrument.timed('write', _write_info)
+    def write(self, folder, filename, data):
+        """Add a symbol to the archive.
+
+        Args:
+            folder (`string`): The category folder, can be None.
+            filename (`string`): The symbol file name.
+            data (`string`): The symbol content.
+
+        Returns:
+            string: The member name of the symbol.
+        """
+        if folder:
+            name = folder + '/' + filename
+        else:
+            name = filename
+        data = _encode(data)
+        with self._lock:
+            self._add(name, data)
+        return name
+
+    def _add(self, name, data):
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, time.localtime(self._mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            self._zip.writestr(info, data)
+            return
+
+        info = tarfile.TarInfo(name)
+        info.mtime = self._mtime
+        info.mode = 0o644
+        if self._dedup:
+            digest = hashlib.sha1(data).hexdigest()
+            source = self._store.get(digest)
+            if source is not None and source != name:
+                info.type = tarfile.LNKTYPE
+                info.linkname = source
+                self._tar.addfile(info)
+                return
+            self._store.setdefault(digest, name)
+        info.size = len(data)
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        """Finish the archive."""
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+
+    def summary(self):
+        return None
+
+
+class CheckWriter(object):
+    """Compare rendered symbols against an existing directory tree.
+
+    Nothing is written. Existing files are compared by size first and by
+    content hash if the sizes match, comparisons run in a thread pool.
+    Symbols that a build would remove are reported as extra.
+
+    Args:
+        path (`string`): The output directory to verify.
+        jobs (int): Number of parallel comparisons.
+        extra (`bool`): Report symbols in the tree that were not rendered.
+    """
+
+    MISSING, DIFFERS = 'missing', 'differs'
+
+    def __init__(self, path, jobs=1, extra=True):
+        self.path = path
+        self._extra = extra
+        self.written = set()
+        self._pool = ThreadPool(jobs)
+        self._results = []
+        self.drift = []
+
+    @staticmethod
+    def _compare(path, size, digest):
+        try:
+            st = os.stat(path)
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+            return CheckWriter.MISSING
+        if st.st_size != size:
+            return CheckWriter.DIFFERS
+        h = open(path, 'rb')
+        try:
+            if hashlib.sha1(h.read()).hexdigest() != digest:
+                return CheckWriter.DIFFERS
+        finally:
+            h.close()
+        return None
+
+    def write(self, folder, filename, data):
+        """Queue a symbol for comparison.
+
+        Args:
+            folder (`string`): The category folder, can be None.
+            filename (`string`): The symbol file name.
+            data (`string`): The expected symbol content.
+
+        Returns:
+            string: The path of the compared symbol.
+        """
+        path = self.path_of(folder, filename)
+        data = _encode(data)
+        self.written.add(path)
+        result = self._pool.apply_async(
+            self._compare,
+            (path, len(data), hashlib.sha1(data).hexdigest()))
+        self._results.append((path, result))
+        return path
+
+    def path_of(self, folder, filename):
+        """Path of a symbol in the output directory."""
+        if folder:
+            return os.path.normpath(os.path.join(self.path, folder, filename))
+        return os.path.normpath(os.path.join(self.path, filename))
+
+    def remove(self, folder, filename):
+        """Report a symbol that should be removed as extra.
+
+        Returns:
+            None: Nothing is removed.
+        """
+        path = self.path_of(folder, filename)
+        if os.path.exists(path):
+            self.drift.append(('extra', path))
+        return None
+
+    def close(self):
+        """Wait for all comparisons and collect the drift."""
+        self._pool.close()
+        self._pool.join()
+        for path, result in self._results:
+            state = result.get()
+            if state:
+                self.drift.append((state, path))
+        self._results = []
+        if self._extra:
+            reported = set(path for _, path in self.drift)
+            for r, d, f in os.walk(self.path):
+                for name in f:
+                    path = os.path.normpath(os.path.join(r, name))
+                    if name.endswith('.sym') and path not in self.written \
+                            and path not in reported:
+                        self.drift.append(('extra', path))
+        self.drift.sort(key=lambda x: x[1])
+
+    @property
+    def ok(self):
+        """True if the tree is up to date."""
+        return not self.drift
+
+    def summary(self):
+        lines = ['%s: %s' % d for d in self.drift]
+        if self.drift:
+            lines.append('%d symbols out of date' % len(self.drift))
+        else:
+            lines.append('%d symbols up to date' % len(self.written))
+        return '\n'.join(lines)
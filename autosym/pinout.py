@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Import of vendor pinout tables"""
+
+from __future__ import print_function, absolute_import
+import os
+import csv
+import sys
+import errno
+from optparse import OptionParser
+
+from autosym import render
+from autosym.description import Description, Pin
+from autosym.output import DirectoryWriter
+
+# vendor pin types to autosym pin types, unknown types are kept
+TYPES = {
+    'i': 'in', 'input': 'in',
+    'o': 'out', 'output': 'out',
+    'i/o': 'io', 'io': 'io', 'inout': 'io', 'bidir': 'io',
+    'bidirectional': 'io',
+    'p': 'pwr', 'power': 'pwr', 'ground': 'pwr', 'gnd': 'pwr', 'supply': 'pwr',
+    'a': 'pas', 'analog': 'pas', 'passive': 'pas', 'nc': 'pas',
+    'od': 'oc', 'open drain': 'oc', 'open collector': 'oc',
+    'clock': 'clk',
+}
+
+SIDES = {
+    'l': Pin.Direction.left, 'left': Pin.Direction.left,
+    'r': Pin.Direction.right, 'right': Pin.Direction.right,
+}
+
+
+class PinoutError(Exception):
+    """A pinout table can't be imported."""
+    pass
+
+
+def read_pinout(handler, path, columns, packages, delimiter=None):
+    """Build a description from a pinout table.
+
+    The table is read row by row and every row is added as a pin, no
+    intermediate text is created. The returned description is built and
+    only lacks the description entries like ``device``.
+
+    Args:
+        handler (file): The CSV or TSV table with a header row.
+        path (`string`): The table path, used as description path.
+        columns (dict): Column names of the fields ``name``, ``type`` and
+                        ``side``, fields default to the column of the same
+                        name. Without a type column pins are ``io``, without
+                        a side column or side they are placed on the left.
+        packages (list): ``(package, column)`` tuples, one variant with the
+                         pin numbers of the column is created per package.
+        delimiter (`string`): Field delimiter, detected if None.
+
+    Returns:
+        `autosym.description.Description`: The description.
+
+    Raises:
+        PinoutError: A column is missing or a row is invalid.
+    """
+    first = handler.readline()
+    if delimiter is None:
+        delimiter = '\t' if '\t' in first else \
+            ';' if first.count(';') > first.count(',') else ','
+    header = next(csv.reader([first], delimiter=delimiter))
+    lookup = dict((h.strip().lower(), i) for i, h in enumerate(header))
+
+    def column(name):
+        try:
+            return lookup[name.strip().lower()]
+        except KeyError:
+            raise PinoutError('Column %s not found in %s.' % (name, path))
+
+    def optional(field):
+        if field in columns:
+            return column(columns[field])
+        return lookup.get(field)
+
+    name_col = column(columns.get('name', 'name'))
+    type_col = optional('type')
+    side_col = optional('side')
+    number_cols = [column(c) for _, c in packages]
+
+    symd = Description(path)
+    for package, _ in packages:
+        symd.add_variant(package, package)
+
+    reader = csv.reader(handler, delimiter=delimiter)
+    for line_nr, row in enumerate(reader, 2):
+        if not row or not any(row):
+            continue
+        row = row + [''] * (len(header) - len(row))
+        name = row[name_col].strip()
+        numbers = [row[c].strip() or '-' for c in number_cols]
+        if not name or all(n == '-' for n in numbers):
+            continue
+        io_type = 'io'
+        if type_col is not None:
+            io_type = row[type_col].strip()
+            io_type = TYPES.get(io_type.lower(), io_type) or 'io'
+        direction = Pin.Direction.left
+        if side_col is not None and row[side_col].strip():
+            side = row[side_col].strip().lower()
+            if side not in SIDES:
+                raise PinoutError('Unknown side %r in %s line %d.' % (
+                    row[side_col], path, line_nr))
+            direction = SIDES[side]
+        symd.add_pin(direction, numbers, name, io_type)
+    symd.build()
+    return symd
+
+
+def _split(option, value):
+    if '=' not in value:
+        raise ValueError('%s needs KEY=VALUE, got %r' % (option, value))
+    return [x.strip() for x in value.split('=', 1)]
+
+
+def main(argv=None):
+    usage = "usage: %prog import-pinout [options] pinout-table [output-path]"
+    parser = OptionParser(usage=usage, prog="autosym")
+    parser.add_option("-d", "--device", metavar="NAME", dest="device",
+                      help="device name (required)")
+    parser.add_option("--category", metavar="NAME", dest="category",
+                      default=None, help="device category")
+    parser.add_option("--refdes", metavar="PREFIX", dest="refdes",
+                      default="U?", help="reference designator "
+                                         "[default: %default]")
+    parser.add_option("-m", "--map", metavar="FIELD=COLUMN",
+                      default=[], action="append", dest="columns",
+                      help="column of the field name, type, side or number, "
+                           "fields default to the column of the same name, "
+                           "type and side are optional")
+    parser.add_option("-p", "--package", metavar="PACKAGE=COLUMN",
+                      default=[], action="append", dest="packages",
+                      help="create a variant with the pin numbers of COLUMN, "
+                           "can be repeated [default: -=number]")
+    parser.add_option("--footprint", metavar="PACKAGE=FOOTPRINT",
+                      default=[], action="append", dest="footprints",
+                      help="footprint of a package, can be repeated")
+    parser.add_option("--delimiter", metavar="CHAR", dest="delimiter",
+                      default=None, help="field delimiter, detected from "
+                                         "the header by default")
+    parser.add_option("--symd", metavar="FILE", dest="symd",
+                      default=None, help="also write a symbol description")
+    parser.add_option("-c",
+                      default=False, action="store_true", dest="categories",
+                      help="place symbols in category subfolders")
+    parser.add_option("-r", "--renderer", metavar="NAME", dest="renderer",
+                      default="gschem", help="output format "
+                                             "[default: %default]")
+    (options, args) = parser.parse_args(argv)
+
+    if len(args) not in (1, 2):
+        parser.error("incorrect number of arguments")
+    if not options.device:
+        parser.error("--device is required")
+    if len(args) == 1 and not options.symd:
+        parser.error("nothing to do, give an output path or --symd")
+
+    try:
+        columns = dict(_split('--map', c) for c in options.columns)
+        packages = [tuple(_split('--package', p)) for p in options.packages]
+        footprints = [_split('--footprint', f) for f in options.footprints]
+        renderer = render.get_renderer(options.renderer)
+    except (ValueError, KeyError) as e:
+        parser.error(str(e))
+    if not packages:
+        packages = [('-', columns.get('number', 'number'))]
+
+    table = args[0]
+    try:
+        if table == '-':
+            symd = read_pinout(sys.stdin, table, columns, packages,
+                               options.delimiter)
+        else:
+            h = open(table)
+            try:
+                symd = read_pinout(h, table, columns, packages,
+                                   options.delimiter)
+            finally:
+                h.close()
+    except PinoutError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    symd.descriptions['device'] = options.device
+    symd.descriptions['refdes'] = options.refdes
+    if options.category:
+        symd.descriptions['category'] = options.category
+    if footprints:
+        for package, footprint in footprints:
+            symd.add_footprints(package, [footprint])
+        symd.build()
+
+    if options.symd:
+        h = open(options.symd, 'w')
+        try:
+            symd.dump(h)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        finally:
+            h.close()
+
+    if len(args) == 2:
+        output_path = args[1]
+        try:
+            os.makedirs(output_path)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+        writer = DirectoryWriter(output_path)
+        for index, variant in enumerate(symd.variants):
+            g = renderer(symd)
+            data = g.generate(index)
+            subfolder, filename = g.filename(index)
+            if not options.categories:
+                subfolder = None
+            print(writer.write(subfolder, filename, data))
+        writer.close()
+    return 0
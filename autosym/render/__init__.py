@@ -14,3 +14,98 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Renderer registry.
+
+Renderers are classes constructed with a parsed
+`autosym.description.Description` that provide ``generate(variant_id)`` and
+``filename(variant_id)`` like `autosym.render.gschem.Symbol`. Additional
+renderers are registered by other packages with an entry point in the group
+``autosym.renderers``. Renderer modules are only imported when selected.
+"""
+
+import importlib
+import threading
+
+ENTRY_POINT_GROUP = 'autosym.renderers'
+
+_builtin = {
+    'gschem': 'autosym.render.gschem:Symbol',
+}
+
+_lock = threading.Lock()
+_entry_points = None
+_loaded = {}
+
+
+def _discover():
+    global _entry_points
+    if _entry_points is not None:
+        return _entry_points
+    found = {}
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            pkg_resources = None
+        if pkg_resources is not None:
+            for ep in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP):
+                found[ep.name] = '%s:%s' % (ep.module_name,
+                                            '.'.join(ep.attrs))
+    else:
+        eps = metadata.entry_points()
+        if hasattr(eps, 'select'):
+            eps = eps.select(group=ENTRY_POINT_GROUP)
+        else:
+            eps = eps.get(ENTRY_POINT_GROUP, [])
+        for ep in eps:
+            found[ep.name] = ep.value
+    _entry_points = found
+    return found
+
+
+def register(name, target):
+    """Register a renderer.
+
+    Args:
+        name (`string`): The renderer name.
+        target (`string`): The renderer class as ``module:Class``.
+    """
+    with _lock:
+        _builtin[name] = target
+        _loaded.pop(name, None)
+
+
+def available():
+    """Sorted list of all renderer names."""
+    names = set(_builtin)
+    names.update(_discover())
+    return sorted(names)
+
+
+def get_renderer(name):
+    """Get a renderer class by name, importing it on first use.
+
+    Args:
+        name (`string`): The renderer name.
+
+    Raises:
+        KeyError: The renderer is unknown.
+    """
+    with _lock:
+        renderer = _loaded.get(name)
+        if renderer is not None:
+            return renderer
+        target = _builtin.get(name)
+        if target is None:
+            target = _discover().get(name)
+        if target is None:
+            raise KeyError('Unknown renderer %s.' % name)
+        module, _, attr = target.partition(':')
+        renderer = importlib.import_module(module)
+        for part in attr.split('.'):
+            renderer = getattr(renderer, part)
+        _loaded[name] = renderer
+        return renderer
@@ -17,9 +17,19 @@
 
 """Symbol class to generate symbol file"""
 
+from autosym import instrument
 from autosym.description import Pin
 
 
+def _generate_info(data, symbol, variant_id=0):
+    variant = symbol.description.variants[variant_id]
+    return {'device': symbol.description.descriptions.get('device', ''),
+            'package': variant.package,
+            'pins': len(variant.pins()),
+            'bytes': len(data if isinstance(data, bytes) else
+                         data.encode('utf-8'))}
+
+
 class Symbol(object):
     """Symbol class for gschem.
 
@@ -41,7 +51,18 @@ class Symbol(object):
 
     def __init__(self, desc):
         self.description = desc
-        self.data = 'v 20110115 2\n'
+        # symbol content, joined on access to avoid quadratic string growth
+        self._data = ['v 20110115 2\n']
+        limits = getattr(desc, 'limits', None)
+        self._max_size = limits.output_bytes if limits is not None else None
+        # size of the chunks up to self._counted
+        self._size = 0
+        self._counted = 0
+
+    @property
+    def data(self):
+        """The symbol content rendered so far."""
+        return ''.join(self._data)
 
     def _set_description(self, variant_id, x, y):
         line_spacing = 200
@@ -151,6 +172,7 @@ class Symbol(object):
 
         return self.data
 
+    @instrument.timed('generate', _generate_info)
     def generate(self, variant_id=0):
         """ Generate symbol data.
 
@@ -159,6 +181,10 @@ class Symbol(object):
 
         Returns
             string: Symbol content of the selected variant.
+
+        Raises:
+            LimitExceeded: The symbol exceeds the output limit of the
+                           description.
         """
         options = self.description.options
         symbol_type = options.get('type', 'box')
@@ -210,9 +236,9 @@ class Symbol(object):
             alignment (int): text alignment
             lines (int): amount of lines
         """
-        self.data += "T %d %d %d %d %d %d %d %d %d\n" % (
-            x, y, color, size, visibility, show, angle, alignment, lines)
-        self.data += "%s=%s\n" % (name, value)
+        self._data.append("T %d %d %d %d %d %d %d %d %d\n" % (
+            x, y, color, size, visibility, show, angle, alignment, lines))
+        self._data.append("%s=%s\n" % (name, value))
 
     def set_pin(self, name, number, pin_type, x, y, length=300, mirror=False,
                 show_number=1, show_name=1, label_padding=10):
@@ -235,8 +261,9 @@ class Symbol(object):
             align2 = self._ALIGN_BOTTOM + self._ALIGN_LEFT
             offset = -1
 
-        self.data += "P %d %d %d %d 1 0 0\n" % (x, y, x + length * offset, y)
-        self.data += "{\n"
+        self._data.append("P %d %d %d %d 1 0 0\n" % (
+            x, y, x + length * offset, y))
+        self._data.append("{\n")
         self.set_text('pinnumber', number, x + (length - 50) * offset, y + 50,
                       5, 8, show_number, self._SHOW_VALUE, 0, align2, 1)
         self.set_text('pinseq', number, x + (length - 50) * offset, y + 50, 5,
@@ -246,15 +273,27 @@ class Symbol(object):
 
         self.set_text('pinlabel', name, x + (length + label_padding) * offset,
                       y, 5, 10, show_name, self._SHOW_VALUE, 0, align1, 1)
-        self.data += "}\n"
+        self._data.append("}\n")
+        if self._max_size is not None:
+            self._check_size()
+
+    def _check_size(self):
+        # pins are the only unbounded part of a symbol, checked per pin
+        for chunk in self._data[self._counted:]:
+            self._size += len(chunk)
+        self._counted = len(self._data)
+        self.description.limits.check(self.description.path, 'output_bytes',
+                                      self._size)
 
     def set_box(self, x, y, width, height, color=3, line_width=0):
-        self.data += "B %d %d %d %d %d %d 0 0 -1 -1 0 -1 -1 -1 -1 -1\n" % (
-            x, y, width, height, color, line_width)
+        self._data.append(
+            "B %d %d %d %d %d %d 0 0 -1 -1 0 -1 -1 -1 -1 -1\n" % (
+                x, y, width, height, color, line_width))
 
     def set_circle(self, x, y, radius, color=3, line_width=0):
-        self.data += "V %d %d %d %d %d 0 0 -1 -1 0 -1 -1 -1 -1 -1\n" % (
-            x, y, radius, color, line_width)
+        self._data.append(
+            "V %d %d %d %d %d 0 0 -1 -1 0 -1 -1 -1 -1 -1\n" % (
+                x, y, radius, color, line_width))
 
 
 if __name__ == '__main__':
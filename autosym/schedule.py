@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cost history and build scheduling"""
+
+import os
+import heapq
+import json
+import errno
+import threading
+
+HISTORY_VERSION = 1
+
+# seconds per description byte if there is no history at all
+DEFAULT_RATE = 2e-6
+
+
+def makespan(costs, jobs):
+    """Build time of tasks scheduled in order on parallel workers.
+
+    Args:
+        costs (list): Task durations in scheduling order.
+        jobs (int): Number of workers.
+
+    Returns:
+        float: The finishing time of the last task.
+    """
+    workers = [0.0] * max(min(jobs, len(costs)), 1)
+    for cost in costs:
+        heapq.heappush(workers, heapq.heappop(workers) + cost)
+    return max(workers)
+
+
+class CostHistory(object):
+    """Render costs of descriptions from previous builds.
+
+    Costs are stored per library relative path with the render time and the
+    file size. Files without history are estimated
+    by their size and the average time per byte of the known files.
+
+    Args:
+        path (`string`): The history file, can be None to keep it in memory.
+        root (`string`): The library directory.
+    """
+
+    def __init__(self, path, root):
+        self.path = path
+        self.root = root
+        self._lock = threading.Lock()
+        self._costs = {}
+        self._rate = None
+        if path:
+            self.load()
+
+    def load(self):
+        """Load the history file, a missing or outdated file is ignored."""
+        try:
+            h = open(self.path)
+        except IOError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+            return
+        try:
+            data = json.load(h)
+        except ValueError:
+            data = {}
+        finally:
+            h.close()
+        if data.get('version') == HISTORY_VERSION:
+            self._costs = data.get('costs', {})
+        self._rate = None
+
+    def save(self):
+        """Write the history file."""
+        if not self.path:
+            return
+        data = {'version': HISTORY_VERSION, 'costs': self._costs}
+        tmp = self.path + '.tmp'
+        h = open(tmp, 'w')
+        json.dump(data, h, indent=1, sort_keys=True)
+        h.close()
+        os.rename(tmp, self.path)
+
+    def _key(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def rate(self):
+        """Average render time per description byte."""
+        if self._rate is None:
+            size = sum(c['size'] for c in self._costs.values())
+            duration = sum(c['time'] for c in self._costs.values())
+            self._rate = duration / size if size and duration else \
+                DEFAULT_RATE
+        return self._rate
+
+    def estimate(self, path):
+        """Expected render time of a description in seconds."""
+        cost = self._costs.get(self._key(path))
+        if cost is not None:
+            return cost['time']
+        try:
+            return os.path.getsize(path) * self.rate()
+        except OSError:
+            return 0.0
+
+    def known(self):
+        """True if any render costs are known."""
+        return bool(self._costs)
+
+    def order(self, file_list):
+        """Sort files longest expected render time first."""
+        return sorted(file_list, key=self.estimate, reverse=True)
+
+    def record(self, path, duration):
+        """Store the render cost of a description.
+
+        Args:
+            path (`string`): The description file.
+            duration (float): Render time in seconds.
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        with self._lock:
+            self._costs[self._key(path)] = {'time': duration, 'size': size}
+            self._rate = None
+
+    def prune(self, file_list):
+        """Drop the history of files not in `file_list`."""
+        keys = set(self._key(path) for path in file_list)
+        for key in list(self._costs):
+            if key not in keys:
+                del self._costs[key]
+        self._rate = None
@@ -17,5 +17,8 @@ setup(name='autosym',
           "console_scripts": [
               "autosym=autosym.autosym:main",
                   ],
+          "autosym.renderers": [
+              "gschem=autosym.render.gschem:Symbol",
+                  ],
       }
       )
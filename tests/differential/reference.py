@@ -0,0 +1,557 @@
+# -*- coding: utf-8 -*-
+# autosym - Automatic generic schematic symbol generation
+# Copyright (C) 2015  Markus Hutzler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Frozen reference implementation of the description parser and the gschem
+renderer.
+
+This is the implementation of autosym 0.1, kept unchanged except for Python 3
+compatibility. The differential tests compare every optimized code path
+against it. Do not optimize this module.
+"""
+
+import re
+
+
+re_option = re.compile(r"^\[([A-Za-z ]+)\]?")
+re_config = re.compile(r"^([\S ]+)=([\S ]+)?")
+
+
+class ParsingError(Exception):
+
+    line = ""
+    line_nr = -1
+    file = ""
+
+    def __init__(self, file, line_nr, line):
+        self.line = line
+        self.line_nr = line_nr
+        self.file = file
+
+    def __str__(self):
+        return repr(self.line)
+
+
+class Pin(object):
+    class Direction(object):
+        none, left, right, bottom, top = range(5)
+
+    direction = Direction.none
+    show_number = 1
+
+    def __init__(self, data,
+                 variant_id=-1, direction=Direction.none, position=0):
+        self._number = ""
+        self._name = ""
+        self._io_type = ""
+        self._empty = True
+        self._direction = direction
+        self._position = position
+
+        if len(data) == 3:
+            self._empty = False
+            if variant_id > -1 and type(data[0]) == list:
+                self._number = data[0][variant_id]
+            else:
+                self._number = data[0]
+            self._name = data[1]
+            self._io_type = data[2]
+
+    def __repr__(self):
+        return "<Pin: %s - %s (%d)>" % (self._number,
+                                        self._name,
+                                        self._position)
+
+    @property
+    def number(self):
+        """ The pin number """
+        return self._number
+
+    @property
+    def name(self):
+        """ The pin name """
+        return self._name
+
+    @property
+    def position(self):
+        return self._position
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @property
+    def type(self):
+        return self._io_type
+
+    @property
+    def empty(self):
+        return self._empty
+
+
+class Variant(object):
+    def __init__(self, package, name, footprint=""):
+        self._index = False
+        self._name = name
+        self._package = package
+        self._pins = []
+        self._footprints = []
+        self.footprint = footprint
+        self.options = {}
+
+    def __str__(self):
+        return self.description()
+
+    def append_pin(self, pin, filter_empty=True):
+        if pin.number == '-':
+            return
+        if filter_empty and pin.empty:
+            return
+        self._pins.append(pin)
+
+    def append_footprint(self, fp):
+        self._footprints.append(fp)
+
+    def description(self):
+        ret = ''
+        ret += "<Variant: %s>" % self._name
+        # for pin in self.pins:
+        #    ret += "    %s\n"%str(pin.name)
+        return ret
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def package(self):
+        return self._package
+
+    @property
+    def footprints(self):
+        return self._footprints
+
+    def pins(self, direction=None):
+        if direction:
+            return [x for x in self._pins if x.direction == direction]
+
+        return self._pins
+
+
+class Description(object):
+    """The symbol description parses and holds information for a symbol.
+
+    Tis class provides information about the different variants op a symbol.
+
+    Args:
+        path (`string`): The path to the symbol description file.
+    """
+
+    def __init__(self, path):
+        self._m_left = []
+        self._m_right = []
+        self._variant_lines = []
+        self._variants = []
+        self._descriptions = {}
+        self._options = {}
+        self._footprints = []
+        self._path = path
+        self._error = False
+
+    @property
+    def height(self):
+        """Amount of registered lines."""
+        return max(len(self._m_left), len(self._m_right))
+
+    @staticmethod
+    def _parse_line(line):
+        line.strip(' \t\r\n')
+        c = line.find('#')
+        comment = ""
+        if c == 0:
+            comment = line[c+1:]
+            return "COMMENT", 0, comment
+
+        if c > 0:
+            comment = line[c+1:]
+            line = line[:c]
+
+        if len(line) == 0:
+            return "EMPTY", 0, comment
+
+        m = re_option.match(line)
+        if m:
+            return "OPTION", m.group(1), comment
+
+        m = re_config.match(line)
+        if m:
+            return "CONFIG", list(map(str.strip, m.groups())), comment
+
+        grp = line.split(":")
+        if len(grp) > 1:
+            return "VALUE", list(map(str.strip, grp)), comment
+
+        return "ERROR", 0, comment
+
+    def parse(self):
+        """Parse symbol description."""
+
+        handler = open(self._path)
+        data = handler.readlines()
+
+        option = ''
+        line_nr = 0
+
+        for line in data:
+            line_nr += 1
+            # remove all line white spaces
+            line = line.strip('\n\r\t ')
+            # parse line and check if more handling has to be done
+            vtype, value, comment = self._parse_line(line)
+            if vtype == "ERROR":
+                raise ParsingError(self._path, line_nr, line)
+            if vtype == "OPTION":
+                option = value
+            if option == 'mapping left' and vtype == "VALUE":
+                x = list(value)
+                x[0] = x[0].split(',')
+                self._m_left.append(x)
+            if option == 'mapping left' and vtype == "EMPTY":
+                self._m_left.append([])
+            if option == 'mapping right' and vtype == "VALUE":
+                x = list(value)
+                x[0] = x[0].split(',')
+                self._m_right.append(x)
+            if option == 'mapping right' and vtype == "EMPTY":
+                self._m_right.append([])
+            if option == 'variants' and vtype == "VALUE":
+                self._variant_lines.append(value)
+            if option == 'footprints' and vtype == "VALUE":
+                self._footprints.append(value)
+            if option == 'description' and vtype == "CONFIG":
+                self._descriptions[value[0]] = value[1]
+            if option == 'option' and vtype == "CONFIG":
+                self._options[value[0]] = value[1]
+
+        symbol_type = self._options.get('type', 'box')
+
+        if symbol_type == 'box':
+            for idx, variant in enumerate(self._variant_lines):
+                v = Variant(variant[0], variant[1])
+                for fp in self._footprints:
+                    if len(fp) == 2 and fp[0] == variant[0]:
+                        for f in map(str.strip, fp[1].split(',')):
+                            v.append_footprint(f)
+                cnt = 0
+                for pin in self._m_left:
+                    v.append_pin(Pin(pin, idx, Pin.Direction.left, cnt))
+                    cnt += 1
+                cnt = 0
+                for pin in self._m_right:
+                    v.append_pin(Pin(pin, idx, Pin.Direction.right, cnt))
+                    cnt += 1
+                self._variants.append(v)
+
+        if symbol_type == 'header':
+            rows = int(self._options.get('rows', 1))
+            lines_start = int(self._options.get('lines_start', 1))
+            lines_end = int(self._options.get('lines_end', 10))
+
+            for idx, lines in enumerate(range(lines_start, lines_end+1)):
+                v = Variant('%dx%d' % (rows, lines), 'Header package')
+                pin_nr = 1
+                for nr in range(lines):
+                    pin = Pin([str(pin_nr), str(pin_nr), 'pas'],
+                              idx, Pin.Direction.left, nr+1)
+                    pin_nr += 1
+                    pin.show_number = 0
+                    v.append_pin(pin)
+
+                    if rows == 2:
+                        pin = Pin([str(pin_nr), str(pin_nr), 'pas'],
+                                  idx, Pin.Direction.right, nr+1)
+                        pin_nr += 1
+                        pin.show_number = 0
+                        v.append_pin(pin)
+
+                self._variants.append(v)
+
+    @property
+    def variants(self):
+        """
+        List of variants.
+
+        Variants contain the packaging information and pins of different
+        versions of the same component.
+        """
+        return self._variants
+
+    @property
+    def descriptions(self):
+        """
+        Directory of descriptions.
+
+        Descriptions are key / value pairs that describe the component. Some
+        are placed into the symbol during rendering, others are used by the
+        render to categorize the component.
+        """
+        return self._descriptions
+
+    @property
+    def options(self):
+        """
+        Directory of options.
+
+        Options are key / value pairs that define rendering parameters.
+        """
+        return self._options
+
+
+class Symbol(object):
+    """Symbol class for gschem.
+
+    Params:
+        desc (`autosym.description.Description`) The variant to be used.
+
+    """
+
+    _ALIGN_LEFT = 0
+    _ALIGN_CENTER = 3
+    _ALIGN_RIGHT = 6
+    _ALIGN_TOP = 2
+    _ALIGN_MIDDLE = 1
+    _ALIGN_BOTTOM = 0
+
+    _SHOW_NAME_VALUE = 0
+    _SHOW_VALUE = 1
+    _SHOW_NAME = 2
+
+    def __init__(self, desc):
+        self.description = desc
+        self.data = 'v 20110115 2\n'
+
+    def _set_description(self, variant_id, x, y):
+        line_spacing = 200
+        desc = self.description.descriptions
+        variant = self.description.variants[variant_id]
+
+        if 'refdes' in desc.keys():
+            self.set_text('refdes', desc['refdes'], x, y)
+        if 'device' in desc.keys():
+            self.set_text('device', desc['device'], x, 0)
+
+        hidden_attrs = ['description', 'comment', 'documentation',
+                        'symversion', 'author', 'dist-license', 'use-license']
+
+        main_set = False
+        fp_cnt = len(variant.footprints)
+        for footprint in variant.footprints:
+            if not main_set:
+                y += line_spacing
+                self.set_text('footprint', footprint, x, y,
+                              color=8, size=10, visibility=0,
+                              show=self._SHOW_NAME_VALUE)
+                main_set = True
+            else:
+                fp_cnt -= 1
+                y += line_spacing
+                self.set_text('footprint_%d' % fp_cnt, footprint, x, y,
+                              color=8, size=8, visibility=0,
+                              show=self._SHOW_NAME_VALUE)
+
+        for attr in hidden_attrs[::-1]:
+            y += line_spacing
+            self.set_text(attr, desc.get(attr, ""), x, y,
+                          color=8, size=8, visibility=0,
+                          show=self._SHOW_NAME_VALUE)
+
+    def _generate_box(self, variant_id):
+        options = self.description.options
+
+        symbol_width = int(options.get('symbol_width', 1000))
+        pin_length = int(options.get('pin_length', 300))
+        pin_grid = int(options.get('pin_grid', 200))
+        x_padding = pin_length + 200
+        y_padding = 200
+        box_width = symbol_width
+        box_height = (self.description.height + 1) * pin_grid
+
+        self.set_box(x_padding, y_padding, box_width, box_height)
+
+        variant = self.description.variants[variant_id]
+        for pin in variant.pins():
+            y_pos = box_height - (pin.position + 1) * pin_grid + y_padding
+
+            name = pin.name
+            if name.startswith('!'):
+                name = r'\_' + name[1:]
+
+            if pin.direction == Pin.Direction.left:
+                self.set_pin(name, pin.number, pin.type,
+                             x_padding - pin_length, y_pos, pin_length, False)
+            if pin.direction == Pin.Direction.right:
+                self.set_pin(name, pin.number, pin.type,
+                             x_padding + box_width + pin_length,
+                             y_pos, pin_length, True)
+
+        text_pos = y_padding + box_height + 100
+        self._set_description(variant_id, x_padding, text_pos)
+
+        return self.data
+
+    def _generate_header(self, variant_id):
+        options = self.description.options
+        variant = self.description.variants[variant_id]
+
+        pin_length = int(options.get('pin_length', 150))
+        pin_grid = int(options.get('pin_grid', 200))
+        rows = int(options.get('rows', 1))
+        pin_geometry = options.get('pin_geometry', 'box')
+        x_padding = pin_length + 200
+        y_padding = 200
+        y = y_padding + pin_grid * len(variant.pins())/rows
+        self._set_description(variant_id, x_padding, y)
+        y -= 100
+
+        for pin in variant.pins():
+            y_pin = y-(pin.position-1)*pin_grid
+            if pin.direction == Pin.Direction.left:
+                x = x_padding
+                self.set_pin(pin.name, pin.number, pin.type, x - pin_length,
+                             y_pin, pin_length, False,
+                             show_number=pin.show_number, label_padding=150)
+                if pin_geometry in ['box', 'hole']:
+                    self.set_box(x, y_pin-50, 100, 100, color=4, line_width=30)
+                if pin_geometry in ['circle', 'hole']:
+                    self.set_circle(x+50, y_pin, 50, color=4, line_width=30)
+
+            if pin.direction == Pin.Direction.right:
+                x = x_padding + 800
+                self.set_pin(pin.name, pin.number, pin.type, x + pin_length,
+                             y_pin, pin_length, True,
+                             show_number=pin.show_number, label_padding=150)
+                if pin_geometry in ['box', 'hole']:
+                    self.set_box(x-100, y_pin-50, 100, 100, color=4,
+                                 line_width=30)
+                if pin_geometry in ['circle', 'hole']:
+                    self.set_circle(x-50, y_pin, 50, color=4, line_width=30)
+
+        return self.data
+
+    def generate(self, variant_id=0):
+        """ Generate symbol data.
+
+        Args:
+            variant_id (int): The index of the variant to be used.
+
+        Returns
+            string: Symbol content of the selected variant.
+        """
+        options = self.description.options
+        symbol_type = options.get('type', 'box')
+        if symbol_type == 'header':
+            return self._generate_header(variant_id)
+        return self._generate_box(variant_id)
+
+    def filename(self, variant_id=0):
+        """ Generate symbol file name.
+
+        Args:
+            variant_id: (int): The index of the variant to be used.
+
+        Returns:
+            (string, string): The (folder, filename) of the selected variant.
+                              Folder can be None.
+
+        """
+        desc = self.description.descriptions
+        variant = self.description.variants[variant_id].package
+
+        if variant == '-':
+            variant = ''
+        folder = desc.get('category', '')
+        device = desc.get('device', '')
+        if not device:
+            raise KeyError('Device name is not defined.')
+        if folder:
+            return folder, "%s%s.sym" % (device, variant)
+        return None, "%s%s.sym" % (device, variant)
+
+    def set_text(self, name, value, x, y, color=8, size=10, visibility=1,
+                 show=_SHOW_VALUE, angle=0, alignment=0, lines=1):
+        """Add text component to symbol
+
+        Args:
+            name (string) The text name.
+            value (string): The text value.
+            x (int): x coordinates
+            y (int): y coordinates
+
+        Other Args:
+            color (int): color of text
+            size (int): size of text
+            visibility (int): 1 for visible, 0 for hidden
+            show (int): what should be shown _SHOW_NAME_VALUE, _SHOW_VALUE or
+                        _SHOW_NAME
+            angle (int): text direction 0, 90, 128 or 240
+            alignment (int): text alignment
+            lines (int): amount of lines
+        """
+        self.data += "T %d %d %d %d %d %d %d %d %d\n" % (
+            x, y, color, size, visibility, show, angle, alignment, lines)
+        self.data += "%s=%s\n" % (name, value)
+
+    def set_pin(self, name, number, pin_type, x, y, length=300, mirror=False,
+                show_number=1, show_name=1, label_padding=10):
+        """Add pin to symbol
+
+        Args:
+            name (`string`): The pin name.
+            number (`string`):  The pin number.
+            pin_type (`string`): The pin type.
+
+        Other Params:
+            length (`int`): The pin length
+        mirror (`bool`): Set to true to mirror the pin.
+        """
+        align1 = self._ALIGN_MIDDLE + self._ALIGN_LEFT
+        align2 = self._ALIGN_BOTTOM + self._ALIGN_RIGHT
+        offset = 1
+        if mirror:
+            align1 = self._ALIGN_MIDDLE + self._ALIGN_RIGHT
+            align2 = self._ALIGN_BOTTOM + self._ALIGN_LEFT
+            offset = -1
+
+        self.data += "P %d %d %d %d 1 0 0\n" % (x, y, x + length * offset, y)
+        self.data += "{\n"
+        self.set_text('pinnumber', number, x + (length - 50) * offset, y + 50,
+                      5, 8, show_number, self._SHOW_VALUE, 0, align2, 1)
+        self.set_text('pinseq', number, x + (length - 50) * offset, y + 50, 5,
+                      8, 0, self._SHOW_VALUE, 0, align2, 1)
+        self.set_text('pintype', pin_type, x + (length - 50) * offset, y + 50,
+                      5, 8, 0, self._SHOW_VALUE, 0, align2, 1)
+
+        self.set_text('pinlabel', name, x + (length + label_padding) * offset,
+                      y, 5, 10, show_name, self._SHOW_VALUE, 0, align1, 1)
+        self.data += "}\n"
+
+    def set_box(self, x, y, width, height, color=3, line_width=0):
+        self.data += "B %d %d %d %d %d %d 0 0 -1 -1 0 -1 -1 -1 -1 -1\n" % (
+            x, y, width, height, color, line_width)
+
+    def set_circle(self, x, y, radius, color=3, line_width=0):
+        self.data += "V %d %d %d %d %d 0 0 -1 -1 0 -1 -1 -1 -1 -1\n" % (
+            x, y, radius, color, line_width)
@@ -0,0 +1,172 @@
+"""Differential tests of the parser and renderer against a frozen reference.
+
+Randomized descriptions are rendered by `reference` (the original
+implementation) and by autosym. Every variant must produce byte-identical
+symbols and file names.
+
+Environment:
+    AUTOSYM_DIFF_CASES: Number of random descriptions, defaults to 2000.
+    AUTOSYM_DIFF_SEED: Seed of the first case, defaults to a random seed.
+
+Run with ``python -m unittest discover -s tests/differential -p 'test*.py'``.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import reference
+from autosym import instrument
+from autosym.description import Description
+from autosym.render import gschem
+
+CASES = int(os.environ.get('AUTOSYM_DIFF_CASES', '2000'))
+SEED = int(os.environ.get('AUTOSYM_DIFF_SEED', random.randrange(1 << 30)))
+
+IO_TYPES = ['in', 'out', 'io', 'oc', 'oe', 'pas', 'tp', 'tri', 'clk', 'pwr']
+HIDDEN = ['description', 'comment', 'documentation', 'symversion', 'author',
+          'dist-license', 'use-license']
+
+
+def comment(rnd):
+    return ' # note %d' % rnd.randrange(100) if rnd.random() < 0.2 else ''
+
+
+def random_box(rnd, lines):
+    packages = rnd.sample(['D', 'N', 'PW', 'DW', 'DB', 'RGY', '-', 'QFN'],
+                          rnd.randint(1, 4))
+    lines.append('[variants]')
+    for package in packages:
+        lines.append('%s:%s Package%s' % (package, package, comment(rnd)))
+    lines.append('')
+
+    lines.append('[footprints]')
+    for package in packages + ['XX']:
+        if rnd.random() < 0.7:
+            footprints = ['FP%s_%d' % (package, i)
+                          for i in range(rnd.randint(1, 3))]
+            lines.append('%s:%s' % (package, ', '.join(footprints)))
+    lines.append('')
+
+    for side in ('left', 'right'):
+        if rnd.random() < 0.1:
+            continue
+        lines.append('[mapping %s]' % side)
+        for _ in range(rnd.randint(0, 12)):
+            if rnd.random() < 0.15:
+                lines.append('')
+                continue
+            if rnd.random() < 0.05:
+                lines.append('#%s' % side)
+                continue
+            numbers = [rnd.choice(['-', str(rnd.randint(1, 99))])
+                       if rnd.random() < 0.2 else str(rnd.randint(1, 99))
+                       for _ in packages]
+            name = rnd.choice(['A', 'B', 'CLK', 'GND', 'VCC', 'D%d' % len(
+                lines)])
+            if rnd.random() < 0.3:
+                name = '!' + name
+            lines.append('%s:%s:%s%s' % (','.join(numbers), name,
+                                         rnd.choice(IO_TYPES), comment(rnd)))
+        lines.append('')
+
+    lines.append('[option]')
+    for key, values in (('symbol_width', (600, 1000, 1400)),
+                        ('pin_length', (200, 300)),
+                        ('pin_grid', (100, 200))):
+        if rnd.random() < 0.3:
+            lines.append('%s=%d' % (key, rnd.choice(values)))
+
+
+def random_header(rnd, lines):
+    lines.append('[option]')
+    lines.append('type=header')
+    start = rnd.randint(1, 4)
+    lines.append('rows=%d' % rnd.randint(1, 2))
+    lines.append('lines_start=%d' % start)
+    lines.append('lines_end=%d' % rnd.randint(start, start + 5))
+    if rnd.random() < 0.7:
+        lines.append('pin_geometry=%s' % rnd.choice(
+            ['box', 'circle', 'hole', 'none']))
+    if rnd.random() < 0.3:
+        lines.append('pin_grid=%d' % rnd.choice([100, 200]))
+
+
+def random_description(rnd):
+    lines = []
+    if rnd.random() < 0.3:
+        lines.append('# generated part')
+    lines.append('[description]')
+    lines.append('device=DEV%d' % rnd.randrange(1000))
+    if rnd.random() < 0.7:
+        lines.append('category=%s' % rnd.choice(['logic', 'power', 'misc']))
+    if rnd.random() < 0.8:
+        lines.append('refdes=U?')
+    for attr in rnd.sample(HIDDEN, rnd.randint(0, 3)):
+        lines.append('%s=some %s' % (attr, attr))
+    lines.append('')
+    if rnd.random() < 0.75:
+        random_box(rnd, lines)
+    else:
+        random_header(rnd, lines)
+    return '\n'.join(lines) + '\n'
+
+
+def render(description, symbol, path):
+    symd = description(path)
+    symd.parse()
+    ret = []
+    for index in range(len(symd.variants)):
+        g = symbol(symd)
+        data = g.generate(index)
+        try:
+            filename = g.filename(index)
+        except KeyError:
+            filename = None
+        ret.append((data, filename))
+    return ret
+
+
+class DifferentialTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def compare(self, seed):
+        text = random_description(random.Random(seed))
+        path = os.path.join(self.path, 'part.symd')
+        h = open(path, 'w')
+        h.write(text)
+        h.close()
+        expected = render(reference.Description, reference.Symbol, path)
+        actual = render(Description, gschem.Symbol, path)
+        if actual != expected:
+            self.fail('output differs for AUTOSYM_DIFF_SEED=%d:\n%s' % (
+                seed, text))
+
+    def test_random_descriptions(self):
+        for seed in range(SEED, SEED + CASES):
+            self.compare(seed)
+
+    def test_instrumented(self):
+        def hook(event, data):
+            pass
+        for event in ('parse', 'generate'):
+            instrument.subscribe(event, hook)
+        try:
+            for seed in range(SEED, SEED + max(CASES // 10, 1)):
+                self.compare(seed)
+        finally:
+            for event in ('parse', 'generate'):
+                instrument.unsubscribe(event, hook)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,168 @@
+"""Performance regression tests.
+
+Synthetic parts are parsed and rendered at several sizes. The tests assert
+that time and memory grow about linearly with the number of pins and
+variants by comparing ratios, which keeps them robust on noisy machines.
+
+If a baseline file is given, each run is also compared against it. The
+first run records the baseline, later runs fail if parse or render time
+exceed it by more than the margin. Timings below ``MIN_TIME`` are too noisy
+to compare and are skipped.
+
+Environment:
+    AUTOSYM_PERF_BASELINE: Baseline file, e.g.
+        ``~/.cache/autosym/perf-<hostname>.json``. No baseline is read or
+        written if unset.
+    AUTOSYM_PERF_MARGIN: Allowed slowdown against the baseline, defaults to
+        ``1.5``.
+    AUTOSYM_PERF_UPDATE: Set to ``1`` to rewrite the baseline.
+
+Run with ``python -m unittest discover -s tests/performance -p 'test*.py'``.
+"""
+
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from autosym.description import Description
+from autosym.render import gschem
+
+REPEAT = 3
+# allowed factor on top of linear growth
+SLACK = 3.0
+# shortest baseline time in seconds compared against the margin
+MIN_TIME = 0.01
+
+BASELINE = os.environ.get('AUTOSYM_PERF_BASELINE')
+MARGIN = float(os.environ.get('AUTOSYM_PERF_MARGIN', '1.5'))
+UPDATE = os.environ.get('AUTOSYM_PERF_UPDATE') == '1'
+
+
+def write_part(path, pins, variants):
+    h = open(path, 'w')
+    h.write('[description]\ndevice=PERF%dX%d\ncategory=perf\n\n' % (
+        pins, variants))
+    h.write('[variants]\n')
+    for v in range(variants):
+        h.write('P%d:Package %d\n' % (v, v))
+    h.write('\n[footprints]\n')
+    for v in range(variants):
+        h.write('P%d:FP%d\n' % (v, v))
+    for side, rows in (('left', pins - pins // 2), ('right', pins // 2)):
+        h.write('\n[mapping %s]\n' % side)
+        for i in range(rows):
+            numbers = ','.join('%s%d' % (side[0], i * variants + v + 1)
+                               for v in range(variants))
+            h.write('%s:%s%d:io\n' % (numbers, side.upper(), i))
+    h.close()
+
+
+def measure(path):
+    """Best parse and render time and peak memory of a part."""
+    best = [float('inf'), float('inf')]
+    for _ in range(REPEAT):
+        gc.collect()
+        start = time.perf_counter()
+        symd = Description(path)
+        symd.parse()
+        parsed = time.perf_counter()
+        for index in range(len(symd.variants)):
+            gschem.Symbol(symd).generate(index)
+        done = time.perf_counter()
+        best[0] = min(best[0], parsed - start)
+        best[1] = min(best[1], done - parsed)
+
+    gc.collect()
+    tracemalloc.start()
+    symd = Description(path)
+    symd.parse()
+    for index in range(len(symd.variants)):
+        gschem.Symbol(symd).generate(index)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best[0], best[1], peak
+
+
+def load_baseline():
+    if not BASELINE:
+        return {}
+    try:
+        h = open(BASELINE)
+    except IOError:
+        return {}
+    try:
+        return json.load(h)
+    except ValueError:
+        return {}
+    finally:
+        h.close()
+
+
+class ScalingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.results = {}
+        cls.baseline = {} if UPDATE else load_baseline()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+        if not BASELINE or cls.baseline:
+            return
+        folder = os.path.dirname(BASELINE)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        h = open(BASELINE, 'w')
+        json.dump(cls.results, h, indent=1, sort_keys=True)
+        h.close()
+
+    def run_part(self, pins, variants):
+        key = '%dx%d' % (pins, variants)
+        if key not in self.results:
+            path = os.path.join(self.path, key + '.symd')
+            write_part(path, pins, variants)
+            self.results[key] = measure(path)
+            self.assert_baseline(key, self.results[key])
+        return self.results[key]
+
+    def assert_baseline(self, key, result):
+        if key not in self.baseline:
+            return
+        for name, value, reference in zip(('parse', 'render'), result,
+                                          self.baseline[key]):
+            if reference < MIN_TIME:
+                continue
+            self.assertLess(
+                value, reference * MARGIN,
+                '%s %s took %.4fs, baseline %.4fs in %s' % (
+                    name, key, value, reference, BASELINE))
+
+    def assert_linear(self, sizes, results):
+        for i in range(1, len(sizes)):
+            growth = float(sizes[i]) / sizes[i - 1]
+            for name, column in (('parse', 0), ('render', 1),
+                                 ('memory', 2)):
+                ratio = results[i][column] / results[i - 1][column]
+                self.assertLess(
+                    ratio, growth * SLACK,
+                    '%s grows by %.1f for %.0fx the size (%s -> %s)' % (
+                        name, ratio, growth, sizes[i - 1], sizes[i]))
+
+    def test_pin_scaling(self):
+        sizes = [100, 1000, 10000]
+        self.assert_linear(sizes, [self.run_part(n, 1) for n in sizes])
+
+    def test_variant_scaling(self):
+        sizes = [1, 10, 50]
+        self.assert_linear(sizes, [self.run_part(500, n) for n in sizes])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,19 +1,166 @@
+import io
+import os
+import json
+import sys
+import shutil
+import subprocess
+import threading
+import time
+import tarfile
+import tempfile
 import unittest
+import weakref
+import zipfile
+
+from autosym.description import Description, Pin, Limits, LimitExceeded, \
+    ParsingError, BaseCache
+from autosym.render import gschem
+from autosym.output import DedupWriter, ArchiveWriter, CheckWriter
+from autosym.autosym import main as autosym_main
+from autosym.library import Library, iter_library
+from autosym import library
+from autosym import lint
+from autosym.instrument import MetricsCollector
+from autosym.output import DirectoryWriter
+from autosym.memory import MemoryBudget, parse_size
+from autosym import schedule
+from autosym.pinout import read_pinout
+from autosym.gitdiff import Repository, Change
+from autosym.autosym import remove_stale, select_files, output_name
+from autosym import render
+from autosym.description import read_descriptions
+from optparse import Values
+
+SYMD = """[description]
+device=74HC00
+category=logic
+
+[variants]
+D:SOIC
+N:DIP
+
+[footprints]
+D:SOIC14, SO14
+N:DIP14
+
+[mapping left]
+1,1:A:in
+2,-:B:in
+
+[mapping right]
+3,4:Y:out
+7,7:GND:pwr
+"""
+
+
+def write_file(path, data):
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    h = open(path, 'w')
+    h.write(data)
+    h.close()
+
+
+def run_autosym(*args):
+    """Run the command line, returns the exit status and stdout."""
+    argv, stdout = sys.argv, sys.stdout
+    sys.argv = ['autosym'] + list(args)
+    sys.stdout = io.StringIO()
+    try:
+        return autosym_main(), sys.stdout.getvalue()
+    finally:
+        sys.argv, sys.stdout = argv, stdout
+
+
+def read_file(path):
+    h = open(path)
+    try:
+        return h.read()
+    finally:
+        h.close()
 
 
 class DescriptionTest(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        pass
+        cls.path = tempfile.mkdtemp()
+        filename = os.path.join(cls.path, '74hc00.symd')
+        h = open(filename, 'w')
+        h.write(SYMD)
+        h.close()
+        cls.symd = Description(filename)
+        cls.symd.parse()
 
     @classmethod
     def tearDownClass(cls):
-        pass
+        shutil.rmtree(cls.path)
 
     def test_test(self):
         self.assertEqual(0, 0)
 
+    def test_variant_by_package(self):
+        self.assertEqual(self.symd.variant('N').name, 'DIP')
+        self.assertIsNone(self.symd.variant('Q'))
+
+    def test_footprints_by_package(self):
+        self.assertEqual(self.symd.footprints('D'), ['SOIC14', 'SO14'])
+        self.assertEqual(self.symd.variant('D').footprints,
+                         ['SOIC14', 'SO14'])
+        self.assertEqual(self.symd.footprints('Q'), [])
+
+    def test_pin_lookup(self):
+        variant = self.symd.variant('N')
+        self.assertEqual(variant.pin('4').name, 'Y')
+        self.assertIsNone(variant.pin('2'))
+        self.assertEqual([p.number for p in variant.pins_named('GND')],
+                         ['7'])
+        self.assertEqual([p.name for p in variant.pins_of_type('in')],
+                         ['A'])
+        self.assertEqual([p.name for p in variant.pins(Pin.Direction.right)],
+                         ['Y', 'GND'])
+
+    def test_limits(self):
+        lines = SYMD.splitlines(True)
+        for name, value in (('input_bytes', 100), ('lines', 10),
+                            ('variants', 1), ('pins', 3),
+                            ('total_pins', 9)):
+            symd = Description('limited.symd',
+                               limits=Limits(**{name: value}))
+            with self.assertRaises(LimitExceeded) as cm:
+                symd.parse(lines)
+            self.assertEqual(cm.exception.limit, name)
+        symd = Description('limited.symd', limits=Limits.default())
+        symd.parse(lines)
+        self.assertEqual(len(symd.variants), 2)
+
+    def test_header_limit(self):
+        lines = ['[option]\n', 'type=header\n', 'rows=2\n',
+                 'lines_end=100000\n']
+        symd = Description('header.symd', limits=Limits.default())
+        with self.assertRaises(LimitExceeded) as cm:
+            symd.parse(lines)
+        self.assertEqual(cm.exception.limit, 'variants')
+        self.assertEqual(symd.variants, [])
+
+    def test_header_total_pins(self):
+        # 1024 variants of up to 65536 pins, about 67M pins in total
+        lines = ['[option]\n', 'type=header\n', 'rows=1\n',
+                 'lines_start=64513\n', 'lines_end=65536\n']
+        start = time.time()
+        symd = Description('header.symd', limits=Limits.default())
+        self.assertRaises(LimitExceeded, symd.parse, lines)
+        limits = Limits.default()
+        limits.variants = 1024
+        limits.pins = 65536
+        symd = Description('header.symd', limits=limits)
+        with self.assertRaises(LimitExceeded) as cm:
+            symd.parse(lines)
+        self.assertEqual(cm.exception.limit, 'total_pins')
+        self.assertEqual(symd.variants, [])
+        self.assertLess(time.time() - start, 1.0)
+
     def tearDown(self):
         pass
 
@@ -31,8 +178,956 @@ class GschemRenderTest(unittest.TestCase):
     def test_test(self):
         self.assertEqual(0, 0)
 
+    def test_output_limit(self):
+        lines = SYMD.splitlines(True)
+        symd = Description('limited.symd', limits=Limits(output_bytes=500))
+        symd.parse(lines)
+        with self.assertRaises(LimitExceeded) as cm:
+            gschem.Symbol(symd).generate(0)
+        self.assertEqual(cm.exception.limit, 'output_bytes')
+        symd._limits.output_bytes = None
+        self.assertGreater(len(gschem.Symbol(symd).generate(0)), 500)
+
     def tearDown(self):
         pass
 
+
+class DedupWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_hardlinks(self):
+        writer = DedupWriter(self.path)
+        a = writer.write(None, 'a.sym', 'same')
+        b = writer.write('logic', 'b.sym', 'same')
+        c = writer.write(None, 'c.sym', 'other')
+        writer.close()
+        self.assertEqual(os.stat(a).st_ino, os.stat(b).st_ino)
+        self.assertNotEqual(os.stat(a).st_ino, os.stat(c).st_ino)
+        self.assertEqual(os.stat(a).st_nlink, 2)
+        self.assertEqual((writer.saved_inodes, writer.saved_bytes), (1, 4))
+        self.assertEqual(writer.summary(), 'deduplicated symbols saved '
+                                           '1 inodes and 4 bytes')
+
+    def test_rewrite_does_not_write_through_links(self):
+        writer = DedupWriter(self.path)
+        a = writer.write(None, 'a.sym', 'same')
+        b = writer.write(None, 'b.sym', 'same')
+        writer = DedupWriter(self.path)
+        writer.write(None, 'b.sym', 'changed')
+        self.assertEqual(read_file(a), 'same')
+        self.assertEqual(read_file(b), 'changed')
+        self.assertEqual(os.stat(a).st_nlink, 1)
+
+    def test_rewritten_source(self):
+        writer = DedupWriter(self.path)
+        x = writer.write(None, 'X.sym', 'one')
+        writer.write(None, 'X.sym', 'two')
+        y = writer.write(None, 'Y.sym', 'one')
+        z = writer.write(None, 'Z.sym', 'two')
+        self.assertEqual(read_file(x), 'two')
+        self.assertEqual(read_file(y), 'one')
+        self.assertNotEqual(os.stat(x).st_ino, os.stat(y).st_ino)
+        self.assertEqual(os.stat(x).st_ino, os.stat(z).st_ino)
+
+
+class ArchiveWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, name, dedup=False):
+        path = os.path.join(self.path, name)
+        writer = ArchiveWriter(path, dedup)
+        self.assertEqual(writer.write('logic', 'a.sym', 'same'), 'logic/a.sym')
+        self.assertEqual(writer.write(None, 'b.sym', 'same'), 'b.sym')
+        writer.write(None, 'c.sym', 'other')
+        writer.close()
+        return path
+
+    def test_tar(self):
+        for name in ('out.tar', 'out.tar.gz', 'out.tgz', 'out.tar.bz2'):
+            tar = tarfile.open(self.write(name))
+            try:
+                self.assertEqual(tar.getnames(),
+                                 ['logic/a.sym', 'b.sym', 'c.sym'])
+                self.assertTrue(all(m.isfile() for m in tar.getmembers()))
+                self.assertEqual(tar.extractfile('b.sym').read(), b'same')
+            finally:
+                tar.close()
+
+    def test_tar_dedup(self):
+        tar = tarfile.open(self.write('out.tar', dedup=True))
+        try:
+            link = tar.getmember('b.sym')
+            self.assertEqual(link.type, tarfile.LNKTYPE)
+            self.assertEqual(link.linkname, 'logic/a.sym')
+            self.assertTrue(tar.getmember('logic/a.sym').isfile())
+            self.assertTrue(tar.getmember('c.sym').isfile())
+            self.assertEqual(tar.extractfile('b.sym').read(), b'same')
+        finally:
+            tar.close()
+
+    def test_zip(self):
+        archive = zipfile.ZipFile(self.write('out.zip', dedup=True))
+        try:
+            self.assertEqual(archive.namelist(),
+                             ['logic/a.sym', 'b.sym', 'c.sym'])
+            self.assertEqual(archive.read('b.sym'), b'same')
+        finally:
+            archive.close()
+
+
+class LibraryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.a = os.path.join(self.path, 'logic', '74hc00.symd')
+        self.b = os.path.join(self.path, 'power', 'lm317.symd')
+        write_file(self.a, SYMD)
+        write_file(self.b, '[description]\ndevice=LM317\ncategory=power\n'
+                           '\n[variants]\n-:TO220\n\n[mapping left]\n'
+                           '1:ADJ:in\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_record_and_find(self):
+        lib = Library(self.path)
+        symd = Description(self.a)
+        symd.parse()
+        lib.record(self.a, symd)
+        entry = lib.find('74HC00')
+        self.assertEqual(entry['source'], 'logic/74hc00.symd')
+        self.assertEqual(entry['category'], 'logic')
+        self.assertEqual([(v['package'], v['filename'])
+                          for v in entry['variants']],
+                         [('D', '74HC00D.sym'), ('N', '74HC00N.sym')])
+        self.assertEqual(entry['variants'][0]['footprints'],
+                         ['SOIC14', 'SO14'])
+        self.assertIsNone(lib.find('LM317'))
+        self.assertEqual(lib.description('74HC00').variant('N').name, 'DIP')
+
+    def test_update(self):
+        index = os.path.join(self.path, 'library.idx')
+        lib = Library(self.path, index)
+        self.assertEqual(lib.update(), 2)
+        self.assertEqual(lib.devices, ['74HC00', 'LM317'])
+        self.assertEqual(lib.category('power'), ['LM317'])
+        self.assertEqual(lib.update(), 0)
+        lib.save()
+
+        write_file(self.b, read_file(self.b) + '2:OUT:out\n')
+        lib = Library(self.path, index)
+        self.assertEqual(lib.devices, ['74HC00', 'LM317'])
+        self.assertEqual(lib.update(), 1)
+        self.assertEqual(len(lib.description('LM317').variants[0].pins()),
+                         2)
+
+    def test_update_continues_after_errors(self):
+        lib = Library(self.path)
+        lib.update()
+        write_file(self.a, SYMD + 'broken line\n')
+        broken = os.path.join(self.path, 'broken.symd')
+        write_file(broken, '[include]\nfile=missing.symi\n')
+        self.assertEqual(lib.update(), 0)
+        self.assertEqual(sorted(lib.errors),
+                         ['broken.symd', 'logic/74hc00.symd'])
+        self.assertEqual(lib.devices, ['LM317'])
+
+        write_file(self.a, SYMD)
+        os.remove(broken)
+        self.assertEqual(lib.update(), 1)
+        self.assertEqual(lib.errors, {})
+        self.assertEqual(lib.devices, ['74HC00', 'LM317'])
+
+    def test_prune(self):
+        lib = Library(self.path)
+        lib.update()
+        lib.prune([self.b])
+        self.assertEqual(lib.devices, ['LM317'])
+        self.assertIsNone(lib.find('74HC00'))
+        self.assertIsNone(lib.description('74HC00'))
+
+
+class SelectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.files = []
+        for name, device, category in (
+                ('logic/74hc00.symd', '74HC00', 'logic'),
+                ('logic/74hc02.symd', '74HC02', 'logic'),
+                ('power/lm317.symd', 'LM317', 'power'),
+                ('power/lm7805.symd', 'LM7805', 'power-linear')):
+            path = os.path.join(self.path, name)
+            write_file(path, SYMD.replace('74HC00', device).replace(
+                'category=logic', 'category=' + category))
+            self.files.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def select(self, only_path=(), only_device=(), only_category=()):
+        options = Values({'only_path': list(only_path),
+                          'only_device': list(only_device),
+                          'only_category': list(only_category)})
+        selected = select_files(self.files, self.path, options)
+        return [os.path.basename(f) for f in selected]
+
+    def test_no_filter(self):
+        self.assertEqual(len(self.select()), 4)
+
+    def test_path(self):
+        self.assertEqual(self.select(['power/*']),
+                         ['lm317.symd', 'lm7805.symd'])
+        self.assertEqual(self.select(['*/74hc0?.symd', 'power/lm317.*']),
+                         ['74hc00.symd', '74hc02.symd', 'lm317.symd'])
+        self.assertEqual(self.select(['74hc00.symd']), [])
+
+    def test_device(self):
+        self.assertEqual(self.select(only_device=['LM*']),
+                         ['lm317.symd', 'lm7805.symd'])
+        self.assertEqual(self.select(only_device=['74HC02', 'LM317']),
+                         ['74hc02.symd', 'lm317.symd'])
+        self.assertEqual(self.select(only_device=['74hc*']), [])
+
+    def test_category(self):
+        # categories are matched exactly
+        self.assertEqual(self.select(only_category=['power']),
+                         ['lm317.symd'])
+        self.assertEqual(self.select(only_category=['logic',
+                                                    'power-linear']),
+                         ['74hc00.symd', '74hc02.symd', 'lm7805.symd'])
+
+    def test_combined(self):
+        self.assertEqual(self.select(['logic/*'], ['*02'], ['logic']),
+                         ['74hc02.symd'])
+        self.assertEqual(self.select(['power/*'], only_category=['logic']),
+                         [])
+
+    def test_header_only(self):
+        path = self.files[0]
+        write_file(path, read_file(path) + '[mapping left]\n' +
+                   '9:X:in\n' * 1000)
+        calls = []
+        parse_line = Description.__dict__['_parse_line']
+
+        def count(line):
+            calls.append(line)
+            return parse_line.__func__(line)
+
+        Description._parse_line = staticmethod(count)
+        try:
+            self.assertEqual(self.select(only_device=['LM317']),
+                             ['lm317.symd'])
+            self.assertEqual(read_descriptions(path)['device'], '74HC00')
+        finally:
+            Description._parse_line = parse_line
+        # the scan stops at the first section after [description]
+        self.assertLess(len(calls), 50)
+
+
+class RendererTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        for name in ('copy', 'nested'):
+            render._builtin.pop(name, None)
+            render._loaded.pop(name, None)
+
+    def test_get_renderer(self):
+        self.assertIs(render.get_renderer('gschem'), gschem.Symbol)
+        self.assertIn('gschem', render.available())
+        self.assertRaises(KeyError, render.get_renderer, 'unknown')
+
+    def test_register(self):
+        render.register('copy', 'autosym.render.gschem:Symbol')
+        render.register('nested', 'autosym.description:Pin.Direction')
+        self.assertIs(render.get_renderer('copy'), gschem.Symbol)
+        self.assertIs(render.get_renderer('nested'), Pin.Direction)
+        self.assertIn('copy', render.available())
+        render.register('copy', 'autosym.description:Pin')
+        self.assertIs(render.get_renderer('copy'), Pin)
+
+    def test_lazy_import(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        code = ('import sys, autosym.autosym; '
+                'print("autosym.render.gschem" in sys.modules)')
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=root)
+        self.assertEqual(output.strip(), b'False')
+
+    def test_output_name(self):
+        symd = Description('74hc00.symd')
+        symd.parse(SYMD.splitlines(True))
+        g = gschem.Symbol(symd)
+        options = Values({'categories': True, 'renderers': ['gschem']})
+        self.assertEqual(output_name(g, 'gschem', 0, options),
+                         ('logic', '74HC00D.sym'))
+        options.renderers = ['gschem', 'copy']
+        self.assertEqual(output_name(g, 'copy', 1, options),
+                         ('copy/logic', '74HC00N.sym'))
+        options.categories = False
+        self.assertEqual(output_name(g, 'gschem', 1, options),
+                         ('gschem', '74HC00N.sym'))
+
+    def test_fan_out(self):
+        render.register('copy', 'autosym.render.gschem:Symbol')
+        lib = os.path.join(self.path, 'lib')
+        out = os.path.join(self.path, 'out')
+        write_file(os.path.join(lib, '74hc00.symd'), SYMD)
+        self.assertEqual(run_autosym('-q', '-c', '-r', 'gschem', '-r', 'copy',
+                                     lib, out)[0], 0)
+        found = []
+        for r, d, f in os.walk(out):
+            found.extend(os.path.relpath(os.path.join(r, name), out)
+                         for name in f)
+        self.assertEqual(sorted(found), [
+            'copy/logic/74HC00D.sym', 'copy/logic/74HC00N.sym',
+            'gschem/logic/74HC00D.sym', 'gschem/logic/74HC00N.sym'])
+
+
+class CheckWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_drift(self):
+        out = os.path.join(self.path, 'out')
+        write_file(os.path.join(out, 'same.sym'), 'same')
+        write_file(os.path.join(out, 'logic', 'content.sym'), 'abcd')
+        write_file(os.path.join(out, 'size.sym'), 'short')
+        write_file(os.path.join(out, 'extra.sym'), 'extra')
+        write_file(os.path.join(out, 'notes.txt'), 'not a symbol')
+        writer = CheckWriter(out, jobs=2)
+        writer.write(None, 'same.sym', 'same')
+        writer.write('logic', 'content.sym', 'abce')
+        writer.write(None, 'size.sym', 'longer')
+        writer.write(None, 'missing.sym', 'new')
+        writer.close()
+        self.assertFalse(writer.ok)
+        self.assertEqual(writer.drift, [
+            ('extra', os.path.join(out, 'extra.sym')),
+            ('differs', os.path.join(out, 'logic', 'content.sym')),
+            ('missing', os.path.join(out, 'missing.sym')),
+            ('differs', os.path.join(out, 'size.sym')),
+        ])
+        self.assertTrue(writer.summary().endswith('4 symbols out of date'))
+
+        writer = CheckWriter(out, extra=False)
+        writer.write(None, 'same.sym', 'same')
+        writer.close()
+        self.assertTrue(writer.ok)
+        self.assertEqual(writer.summary(), '1 symbols up to date')
+
+    def test_exit_status(self):
+        lib = os.path.join(self.path, 'lib')
+        out = os.path.join(self.path, 'out')
+        write_file(os.path.join(lib, '74hc00.symd'), SYMD)
+        self.assertEqual(run_autosym('-q', lib, out)[0], 0)
+        self.assertEqual(run_autosym('-q', '--check', lib, out), (0, ''))
+
+        symbol = os.path.join(out, '74HC00D.sym')
+        write_file(symbol, read_file(symbol) + 'L 0 0 100 100 3 0 0 0 -1 -1\n')
+        status, output = run_autosym('-q', '--check', lib, out)
+        self.assertEqual(status, 1)
+        self.assertIn('differs: %s' % symbol, output)
+
+        run_autosym('-q', lib, out)
+        extra = os.path.join(out, 'OLD.sym')
+        write_file(extra, '')
+        status, output = run_autosym('-q', '--check', lib, out)
+        self.assertEqual(status, 1)
+        self.assertIn('extra: %s' % extra, output)
+
+
+LINT_SYMD = """[description]
+device=LINT
+
+[variants]
+D:SOIC
+N:DIP
+
+[footprints]
+D:SOIC8
+Q:QFN8
+
+[mapping left]
+1,1:A:in
+1,2:B:in
+3:C:in
+
+[mapping right]
+4,2:Y:out
+"""
+
+
+class LintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path, 'lint.symd')
+        write_file(self.file, LINT_SYMD)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_lint_file(self):
+        found = [(d.line, d.level, d.code) for d in lint.lint_file(self.file)]
+        self.assertEqual(found, [
+            (10, lint.ERROR, 'unknown-package'),
+            # pin 1 of SOIC on the same side
+            (14, lint.ERROR, 'duplicate-number'),
+            (15, lint.ERROR, 'short-mapping'),
+            # pin 2 of DIP on the left and the right side
+            (18, lint.ERROR, 'duplicate-number'),
+        ])
+        messages = [d.message for d in lint.lint_file(self.file)]
+        self.assertIn('pin number 1 of variant D already used in line 13',
+                      messages)
+        self.assertIn('pin number 2 of variant N already used in line 14',
+                      messages)
+
+    def test_clean_file(self):
+        write_file(self.file, SYMD)
+        self.assertEqual(lint.lint_file(self.file), [])
+
+    def test_json_output(self):
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            status = lint.main(['-j', '1', '--format', 'json', self.path])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(status, 1)
+        records = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[0], {
+            'path': self.file, 'line': 10, 'level': 'error',
+            'code': 'unknown-package',
+            'message': 'footprint for undefined package Q'})
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_text(self):
+        lines = SYMD.replace('category=logic',
+                             'description=NAND \u00b5C gate').splitlines(True)
+        collector = MetricsCollector()
+        collector.attach()
+        try:
+            symd = Description('74hc00.symd')
+            symd.parse(lines)
+            data = gschem.Symbol(symd).generate(0)
+            DirectoryWriter(self.path).write(None, 'a.sym', data)
+        finally:
+            collector.detach()
+        size = len(data.encode('utf-8'))
+        self.assertEqual(size, len(data) + 1)
+        self.assertEqual(collector.counter('written_bytes'), size)
+
+        text = collector.text().splitlines()
+        self.assertEqual(text[:3], [
+            '# TYPE autosym_descriptions counter',
+            '# HELP autosym_descriptions Parsed descriptions.',
+            'autosym_descriptions_total 1'])
+        self.assertIn('autosym_pins_total 7', text)
+        self.assertIn('autosym_written_bytes_total %d' % size, text)
+        self.assertIn('autosym_symbol_bytes_sum %r' % float(size), text)
+        self.assertIn('autosym_symbol_bytes_bucket{le="1024.0"} 0', text)
+        self.assertIn('autosym_symbol_bytes_bucket{le="4096.0"} 1', text)
+        self.assertIn('autosym_symbol_bytes_bucket{le="+Inf"} 1', text)
+        self.assertIn('autosym_generate_seconds_count 1', text)
+        self.assertEqual(text[-1], '# EOF')
+
+
+class MemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path, 'a.symd')
+        write_file(self.file, SYMD)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('100'), 100)
+        self.assertEqual(parse_size('4k'), 4096)
+        self.assertEqual(parse_size('512M'), 512 << 20)
+        self.assertEqual(parse_size('1.5GiB'), 3 << 29)
+        self.assertEqual(parse_size(' 2 MB '), 2 << 20)
+        for text in ('', 'M', '12T', '-1', '1e3'):
+            self.assertRaises(ValueError, parse_size, text)
+
+    def test_track(self):
+        budget = MemoryBudget(64 << 20)
+        budget.start()
+        try:
+            with budget.track(self.file):
+                data = bytearray(1 << 20)
+        finally:
+            budget.stop()
+        self.assertGreater(budget.usage[self.file], 1 << 19)
+        self.assertGreater(budget.peak, 1 << 19)
+        self.assertIn(self.file, budget.report())
+        del data
+
+    def test_track_waits_for_budget(self):
+        budget = MemoryBudget(1)
+        order = []
+        inside = threading.Event()
+        release = threading.Event()
+
+        def first():
+            with budget.track(self.file):
+                order.append('first in')
+                inside.set()
+                release.wait(5)
+                order.append('first out')
+
+        def second():
+            inside.wait(5)
+            with budget.track(self.file):
+                order.append('second in')
+
+        budget.start()
+        try:
+            threads = [threading.Thread(target=first),
+                       threading.Thread(target=second)]
+            for t in threads:
+                t.start()
+            time.sleep(0.1)
+            self.assertEqual(order, ['first in'])
+            release.set()
+            for t in threads:
+                t.join()
+        finally:
+            budget.stop()
+        self.assertEqual(order, ['first in', 'first out', 'second in'])
+
+    def test_ranking(self):
+        large = os.path.join(self.path, 'large.symd')
+        write_file(large, SYMD + ''.join('%d,%d:P%d:io\n' % (i, i, i)
+                                         for i in range(10, 400)))
+        budget = MemoryBudget(1 << 30)
+        budget.start()
+        try:
+            for path in (self.file, large):
+                with budget.track(path):
+                    # like build(), nothing is held when the context exits
+                    symd = Description(path)
+                    symd.parse()
+                    for index in range(len(symd.variants)):
+                        gschem.Symbol(symd).generate(index)
+                    symd = None
+        finally:
+            budget.stop()
+        self.assertGreater(budget.usage[large], 100 << 10)
+        self.assertGreater(budget.usage[large], 5 * budget.usage[self.file])
+        report = budget.report().splitlines()
+        self.assertTrue(report[-2].endswith(large))
+        self.assertTrue(report[-1].endswith(self.file))
+        self.assertGreater(budget._ratio, 64.0)
+
+
+class IncludeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = BaseCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, name, data):
+        path = os.path.join(self.path, name)
+        write_file(path, data)
+        return path
+
+    def parse(self, path):
+        symd = Description(path, cache=self.cache)
+        symd.parse()
+        return symd
+
+    def test_inheritance(self):
+        self.write('base/74xx00.symi', SYMD + '\n[option]\npin_grid=100\n'
+                                             'symbol_width=800\n')
+        path = self.write('74lvc00.symd',
+                          '[include]\nfile=base/74xx00.symi\n\n'
+                          '[description]\ndevice=74LVC00\n\n'
+                          '[option]\nsymbol_width=1000\n\n'
+                          '[mapping right]\n3,4:Y:out\n')
+        symd = self.parse(path)
+        self.assertEqual(symd.descriptions['device'], '74LVC00')
+        self.assertEqual(symd.descriptions['category'], 'logic')
+        self.assertEqual(symd.options, {'pin_grid': '100',
+                                        'symbol_width': '1000'})
+        variant = symd.variant('N')
+        self.assertEqual(variant.footprints, ['DIP14'])
+        self.assertEqual([p.name for p in variant.pins(Pin.Direction.left)],
+                         ['A'])
+        self.assertEqual([p.name for p in variant.pins(Pin.Direction.right)],
+                         ['Y'])
+        self.assertEqual(symd.dependencies,
+                         [os.path.join(self.path, 'base', '74xx00.symi')])
+
+    def test_circular_include(self):
+        self.write('a.symi', '[include]\nfile=b.symi\n')
+        self.write('b.symi', '[include]\nfile=a.symi\n')
+        path = self.write('part.symd', '[include]\nfile=a.symi\n')
+        with self.assertRaises(ParsingError) as cm:
+            self.parse(path)
+        self.assertEqual(cm.exception.line_nr, 2)
+
+    def test_missing_include(self):
+        path = self.write('part.symd', '[description]\ndevice=X\n\n'
+                                       '[include]\nfile=missing.symi\n')
+        with self.assertRaises(ParsingError) as cm:
+            self.parse(path)
+        self.assertEqual((cm.exception.file, cm.exception.line_nr,
+                          cm.exception.line),
+                         (path, 5, 'file=missing.symi'))
+
+    def test_read_descriptions(self):
+        self.write('a.symi', '[include]\nfile=b.symi\nfile=missing.symi\n\n'
+                             '[description]\ncategory=logic\n')
+        self.write('b.symi', '[include]\nfile=a.symi\n\n'
+                             '[description]\ncategory=power\nvendor=B\n')
+        path = self.write('part.symd', '[include]\nfile=a.symi\n\n'
+                                       '[description]\ndevice=X\n')
+        self.assertEqual(read_descriptions(path),
+                         {'device': 'X', 'category': 'logic', 'vendor': 'B'})
+        options = Values({'only_path': [], 'only_device': ['X'],
+                          'only_category': ['logic']})
+        self.assertEqual(select_files([path], self.path, options), [path])
+        self.assertRaises(IOError, read_descriptions,
+                          os.path.join(self.path, 'missing.symd'))
+
+    def test_nested_edit(self):
+        c = self.write('c.symi', '[mapping left]\n1:A:in\n')
+        self.write('b.symi', '[include]\nfile=c.symi\n')
+        path = self.write('a.symd', '[include]\nfile=b.symi\n\n'
+                                    '[description]\ndevice=A\n\n'
+                                    '[variants]\n-:Package\n')
+        self.assertEqual(len(self.parse(path).variants[0].pins()), 1)
+
+        lib = Library(self.path)
+        lib.update()
+        write_file(c, '[mapping left]\n1:A:in\n2:B:in\n')
+        stamp = os.stat(c)
+        os.utime(c, (stamp.st_atime, stamp.st_mtime + 10))
+        self.assertEqual(len(self.parse(path).variants[0].pins()), 2)
+        self.assertEqual(lib.update(), 1)
+        self.assertEqual(len(lib.description('A').variants[0].pins()), 2)
+        self.assertEqual(lib.update(), 0)
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.files = []
+        for name, size in (('a.symd', 100), ('b.symd', 1000), ('c.symd', 10)):
+            self.files.append(self.write(name, size))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, name, size):
+        path = os.path.join(self.path, name)
+        write_file(path, 'x' * size)
+        return path
+
+    def test_makespan(self):
+        self.assertEqual(schedule.makespan([3.0, 2.0, 2.0], 2), 4.0)
+        self.assertEqual(schedule.makespan([1.0, 1.0, 4.0], 2), 5.0)
+        self.assertEqual(schedule.makespan([4.0, 1.0, 1.0], 2), 4.0)
+        self.assertEqual(schedule.makespan([1.0, 2.0], 8), 2.0)
+        self.assertEqual(schedule.makespan([1.0, 2.0], 1), 3.0)
+        self.assertEqual(schedule.makespan([], 4), 0.0)
+
+    def test_estimate_without_history(self):
+        history = schedule.CostHistory(None, self.path)
+        a, b, c = self.files
+        self.assertEqual(history.estimate(a), 100 * schedule.DEFAULT_RATE)
+        self.assertEqual(history.estimate(os.path.join(self.path, 'x')), 0.0)
+        self.assertEqual(history.order(self.files), [b, a, c])
+
+    def test_estimate_with_history(self):
+        index = os.path.join(self.path, 'history.json')
+        history = schedule.CostHistory(index, self.path)
+        a, b, c = self.files
+        history.record(a, 1.0)
+        history.record(c, 5.0)
+        history.save()
+
+        history = schedule.CostHistory(index, self.path)
+        self.assertEqual(history.estimate(a), 1.0)
+        self.assertEqual(history.estimate(c), 5.0)
+        # time per byte of the known files
+        self.assertAlmostEqual(history.estimate(b), 1000 * 6.0 / 110)
+        self.assertEqual(history.order(self.files), [b, c, a])
+
+        history.prune([a, b])
+        self.assertAlmostEqual(history.estimate(b), 10.0)
+        self.assertEqual(history.estimate(c), 10 * 0.01)
+
+    def test_known(self):
+        index = os.path.join(self.path, 'history.json')
+        history = schedule.CostHistory(index, self.path)
+        self.assertFalse(history.known())
+        history.record(self.files[0], 1.0)
+        self.assertTrue(history.known())
+        history.save()
+        with open(index) as h:
+            data = json.load(h)
+        self.assertEqual(data['costs'], {'a.symd': {'time': 1.0, 'size': 100}})
+
+    def test_prediction(self):
+        lib = os.path.join(self.path, 'lib')
+        out = os.path.join(self.path, 'out')
+        index = os.path.join(self.path, 'history.json')
+        write_file(os.path.join(lib, '74hc00.symd'), SYMD)
+        self.assertNotIn('critical path', run_autosym(lib, out)[1])
+        self.assertNotIn('critical path',
+                         run_autosym('--history', index, lib, out)[1])
+        self.assertIn('critical path predicted',
+                      run_autosym('--history', index, lib, out)[1])
+
+
+PINOUT = """Name,Type,Side,QFN,BGA
+VCC,Power,Right,1,A1
+CLK,Clock,Left,2,B2
+DATA,I/O,,3,
+RESET_N,input,left,4,C3
+GND,ground,R,5,A2
+"""
+
+
+class PinoutTest(unittest.TestCase):
+
+    def pins(self, symd):
+        return [[(p.number, p.name, p.type, p.direction)
+                 for p in v.pins() if not p.empty] for v in symd.variants]
+
+    def test_default_columns(self):
+        symd = read_pinout(io.StringIO(PINOUT), 'pinout.csv', {},
+                           [('QFN', 'QFN'), ('BGA', 'BGA')])
+        left, right = Pin.Direction.left, Pin.Direction.right
+        self.assertEqual(self.pins(symd), [
+            [('2', 'CLK', 'clk', left), ('3', 'DATA', 'io', left),
+             ('4', 'RESET_N', 'in', left), ('1', 'VCC', 'pwr', right),
+             ('5', 'GND', 'pwr', right)],
+            [('B2', 'CLK', 'clk', left), ('C3', 'RESET_N', 'in', left),
+             ('A1', 'VCC', 'pwr', right), ('A2', 'GND', 'pwr', right)],
+        ])
+
+    def test_round_trip(self):
+        symd = read_pinout(io.StringIO(PINOUT.replace(',', ';')),
+                           'pinout.csv', {'name': 'name'},
+                           [('QFN', 'QFN'), ('BGA', 'BGA')])
+        symd.descriptions['device'] = 'PINOUT'
+        symd.add_footprints('QFN', ['QFN5'])
+        symd.build()
+        handler = io.StringIO()
+        symd.dump(handler)
+        parsed = Description('pinout.symd')
+        parsed.parse(handler.getvalue().splitlines(True))
+        self.assertEqual(self.pins(parsed), self.pins(symd))
+        self.assertEqual(parsed.descriptions, {'device': 'PINOUT'})
+        self.assertEqual([v.package for v in parsed.variants],
+                         ['QFN', 'BGA'])
+        self.assertEqual(parsed.footprints('QFN'), ['QFN5'])
+
+
+def has_git():
+    try:
+        subprocess.check_output(['git', '--version'])
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+@unittest.skipUnless(has_git(), 'git is not available')
+class GitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.realpath(tempfile.mkdtemp())
+        self.lib = os.path.join(self.path, 'lib')
+        self.out = os.path.join(self.path, 'out')
+        self.git('init', '-q')
+        for name in ('A', 'B', 'C', 'D'):
+            self.write(name.lower() + '.symd', name)
+        self.git('add', 'lib')
+        self.git('commit', '-q', '-m', 'library')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def git(self, *args):
+        subprocess.check_output(
+            ('git', '-c', 'user.name=autosym', '-c',
+             'user.email=autosym@example.com') + args,
+            cwd=self.path, stderr=subprocess.STDOUT)
+
+    def write(self, name, device):
+        path = os.path.join(self.lib, name)
+        write_file(path, SYMD.replace('74HC00', device))
+        return path
+
+    def lib_path(self, name):
+        return os.path.join(self.lib, name)
+
+    def test_changes(self):
+        self.write('a.symd', 'A2')
+        self.git('rm', '-q', 'lib/b.symd')
+        os.mkdir(self.lib_path('sub'))
+        self.git('mv', 'lib/c.symd', 'lib/sub/c.symd')
+        # not similar to b.symd, which git would detect as a rename
+        write_file(self.lib_path('e.symd'), '[description]\ndevice=E\n')
+        self.git('add', 'lib/e.symd')
+        write_file(self.lib_path('f.symd'), '[description]\ndevice=F\n')
+        write_file(os.path.join(self.path, 'other.txt'), 'outside')
+
+        changes = Repository(self.lib).changes('HEAD')
+        self.assertEqual(sorted(changes, key=lambda c: c.path or ''), [
+            Change('D', None, self.lib_path('b.symd')),
+            Change('M', self.lib_path('a.symd'), self.lib_path('a.symd')),
+            Change('A', self.lib_path('e.symd'), None),
+            Change('A', self.lib_path('f.symd'), None),
+            Change('R', self.lib_path('sub/c.symd'), self.lib_path('c.symd')),
+        ])
+
+    def test_show(self):
+        self.write('a.symd', 'A2')
+        lines = Repository(self.lib).show('HEAD', self.lib_path('a.symd'))
+        self.assertIn('device=A\n', lines)
+
+    def test_remove_stale(self):
+        self.assertEqual(run_autosym('-q', self.lib, self.out)[0], 0)
+        self.git('mv', 'lib/c.symd', 'lib/c2.symd')
+        options = Values({'since': 'HEAD', 'limits': None, 'quiet': True,
+                          'renderers': ['gschem'], 'categories': False})
+        writer = DirectoryWriter(self.out)
+        # CD.sym is rendered again by the renamed description
+        writer.write(None, 'CD.sym', 'new')
+        remove_stale(Repository(self.lib), [self.lib_path('c.symd')],
+                     writer, options)
+        self.assertEqual(read_file(os.path.join(self.out, 'CD.sym')), 'new')
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'CN.sym')))
+        self.assertTrue(os.path.exists(os.path.join(self.out, 'DN.sym')))
+
+    def test_check_since(self):
+        self.assertEqual(run_autosym('-q', self.lib, self.out)[0], 0)
+        self.git('rm', '-q', 'lib/b.symd')
+        status, output = run_autosym('-q', '--check', '--since', 'HEAD',
+                                     self.lib, self.out)
+        self.assertEqual(status, 1)
+        self.assertIn('extra: %s' % os.path.join(self.out, 'BD.sym'), output)
+        self.assertIn('extra: %s' % os.path.join(self.out, 'BN.sym'), output)
+        self.assertIn('2 symbols out of date', output)
+        self.assertTrue(os.path.exists(os.path.join(self.out, 'BD.sym')))
+
+        self.assertEqual(run_autosym('-q', '--since', 'HEAD', self.lib,
+                                     self.out)[0], 0)
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'BD.sym')))
+        self.assertEqual(run_autosym('-q', '--check', '--since', 'HEAD',
+                                     self.lib, self.out), (0, ''))
+        self.assertEqual(run_autosym('-q', '--check', self.lib, self.out),
+                         (0, ''))
+
+
+class IterLibraryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.a = os.path.join(self.path, 'a.symd')
+        self.b = os.path.join(self.path, 'sub', 'b.symd')
+        write_file(self.a, SYMD)
+        write_file(self.b, SYMD.replace('74HC00', '74HC02').replace(
+            'category=logic\n', ''))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_symbols(self):
+        symbols = sorted(iter_library(self.path))
+        self.assertEqual([s[:3] for s in symbols], [
+            (self.a, 'logic', '74HC00D.sym'),
+            (self.a, 'logic', '74HC00N.sym'),
+            (self.b, None, '74HC02D.sym'),
+            (self.b, None, '74HC02N.sym'),
+        ])
+        symd = Description(self.a)
+        symd.parse()
+        self.assertEqual(symbols[1][3], gschem.Symbol(symd).generate(1))
+
+    def test_releases_descriptions(self):
+        refs = []
+        alive = []
+
+        class Tracked(Description):
+            def __init__(self, *args, **kwargs):
+                # earlier descriptions must be gone before the next is read
+                alive.extend(r() is not None for r in refs)
+                Description.__init__(self, *args, **kwargs)
+                refs.append(weakref.ref(self))
+
+        library.Description = Tracked
+        try:
+            for source, folder, filename, data in iter_library(self.path):
+                pass
+        finally:
+            library.Description = Description
+        self.assertEqual(len(refs), 2)
+        self.assertEqual(alive, [False])
+
+    def test_errors(self):
+        bad = os.path.join(self.path, 'bad.symd')
+        write_file(bad, '[include]\nfile=missing.symi\n')
+        self.assertRaises(ParsingError, list, iter_library(self.path))
+
+        errors = []
+        symbols = list(iter_library(
+            self.path, on_error=lambda source, e: errors.append((source, e))))
+        # files after the invalid one are still rendered
+        self.assertEqual(sorted(s[2] for s in symbols), [
+            '74HC00D.sym', '74HC00N.sym', '74HC02D.sym', '74HC02N.sym'])
+        self.assertEqual([(source, type(e)) for source, e in errors],
+                         [(bad, ParsingError)])
+
+    def test_limit_errors(self):
+        errors = []
+        symbols = list(iter_library(
+            self.path, limits=Limits(output_bytes=500),
+            on_error=lambda source, e: errors.append((source, e))))
+        self.assertEqual(symbols, [])
+        self.assertEqual(sorted((source, e.limit) for source, e in errors),
+                         [(self.a, 'output_bytes'), (self.b, 'output_bytes')])
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)